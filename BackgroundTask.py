@@ -0,0 +1,38 @@
+'''
+Runs a function on the global thread pool and reports back through signals
+'''
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+
+
+class TaskSignals(QObject):
+    finished = pyqtSignal(object)
+    failed = pyqtSignal(str)
+    # (done, total) from the progress callback, see withProgress
+    progress = pyqtSignal(int, int)
+
+
+class BackgroundTask(QRunnable):
+    def __init__(self, func, *args, withProgress=False):
+        '''
+        runs func(*args). With withProgress, func is also passed a progress
+        callback, progress=f(done, total), that emits signals.progress
+        '''
+        super(BackgroundTask, self).__init__()
+        self.func = func
+        self.args = args
+        self.withProgress = withProgress
+        self.signals = TaskSignals()
+
+    def run(self):
+        kwargs = {'progress': self.signals.progress.emit} if self.withProgress else {}
+        try:
+            result = self.func(*self.args, **kwargs)
+        except Exception as e:
+            self.signals.failed.emit(str(e))
+            return
+        self.signals.finished.emit(result)
+
+    def start(self):
+        ''' queue on the global thread pool, keep a reference until finished '''
+        QThreadPool.globalInstance().start(self)
+        return self
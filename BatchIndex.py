@@ -0,0 +1,342 @@
+'''
+Lookup tables for a batch of simulations, built once when a batch is opened
+
+The parsed parameter table, the unique values and the code matrix are saved in a sidecar index file in the batch folder. Opening the batch
+again loads that file in one read, unless the parameter list or the
+simulation name changed since it was written. The mtime of the batch folder
+is not used, the browser writes its own tables and previews into it.
+
+The parameter table itself is not kept: every parameter is stored as small
+integer codes (uint8 while it has at most 256 values) into its unique values,
+the value of a parameter is uniqueVals[idx][codes[row, idx]].
+'''
+import os
+import zipfile
+import numpy as np
+from PathResolver import PathResolver
+
+INDEX_FILENAME = 'solutionbrowser.npz'
+INDEX_VERSION = 6
+
+# use a dense grid while it has at most this many cells per simulation, sparse
+# or irregular sweeps use a sorted key lookup instead
+MAX_GRID_CELLS_PER_SIM = 16
+
+
+class BatchIndex:
+    __slots__ = ('parNames', 'numSims', 'simNums', 'simulationName', 'pathResolver',
+                 'fileExists', 'codes', 'uniqueVals', 'shape', 'grid', 'sortedRows',
+                 'sortedKeys', 'tree')
+
+    def __init__(self, simNums, parNames, codes, uniqueVals):
+        self.parNames = parNames
+        self.numSims = len(simNums)
+        self.simNums = np.asarray(simNums, dtype=np.int32)
+        self.simulationName = None
+        self.pathResolver = None
+        # kind -> bool array of existing files, see scan_files
+        self.fileExists = None
+
+        # unique values and per row value index for every parameter
+        self.codes = codes
+        self.uniqueVals = uniqueVals
+
+        # row lookup, a dense grid with one axis per parameter, or sorted keys
+        self.shape = tuple(len(values) for values in uniqueVals)
+        numCells = np.prod(self.shape, dtype=float)
+        if numCells <= MAX_GRID_CELLS_PER_SIM * max(self.numSims, 4096):
+            self.grid = BatchIndex.build_grid(self.codes, self.uniqueVals)
+            self.sortedRows = None
+            self.sortedKeys = None
+        else:
+            self.grid = None
+            keys = np.ravel_multi_index(tuple(self.codes.T), self.shape)
+            self.sortedRows = np.argsort(keys).astype(np.int32)
+            self.sortedKeys = keys[self.sortedRows]
+
+        # for nearest neighbour queries, built on first use
+        self.tree = None
+
+    @staticmethod
+    def open_batch(batchFolder, parlistFileName, templates=None):
+        '''
+        opens the batch in batchFolder from its sidecar index, or parses the
+        parameter list and writes the index if it is missing or out of date.
+        File paths are formatted from templates, see PathResolver
+        '''
+        indexFile = os.path.join(batchFolder, INDEX_FILENAME)
+        csvFile = os.path.join(batchFolder, parlistFileName)
+        index = BatchIndex.load(indexFile, csvFile)
+        if index is None:
+            index = BatchIndex.from_csv(batchFolder, csvFile)
+            index.save(indexFile, csvFile)
+        index.pathResolver = PathResolver(batchFolder, index.simulationName, templates)
+        return index
+
+    @staticmethod
+    def get_simulation_name(batchFolder):
+        fc = os.listdir(batchFolder)
+        fc = [f for f in fc if 'parlist' not in f and 'params' not in f
+              and not f.startswith('solutionbrowser')]
+        fc = [f.split('_')[0] for f in fc if '_' in f]
+        simulationName = list(set(fc))
+        if len(simulationName) != 1:
+            raise ValueError('could not determine simulation name in %s' % batchFolder)
+        return simulationName[0]
+
+    @staticmethod
+    def from_csv(batchFolder, csvFile):
+        simulationName = BatchIndex.get_simulation_name(batchFolder)
+
+        # pandas is slow to import and only needed to parse the parameter list
+        import pandas as pd
+
+        # read csv as dataframe and get parameter names
+        parData = pd.read_csv(csvFile)
+        parNames = list(parData.columns)
+        parNames.remove('SimNum')
+
+        # only the codes are kept, not the table
+        codes, uniqueVals = BatchIndex.build_codes(parData, parNames)
+        index = BatchIndex(parData['SimNum'].values, parNames, codes, uniqueVals)
+        index.simulationName = simulationName
+        return index
+
+    @staticmethod
+    def load(indexFile, csvFile):
+        '''
+        loads a sidecar index, returns None if it does not exist, cannot be
+        read, has another version, or the parameter list or the simulation
+        name changed after it was written
+        '''
+        batchFolder = os.path.dirname(indexFile)
+        try:
+            # listed again, sim folders may have been renamed
+            simulationName = BatchIndex.get_simulation_name(batchFolder)
+            with np.load(indexFile) as data:
+                if (int(data['version']) != INDEX_VERSION
+                        or str(data['parlistFile']) != os.path.basename(csvFile)
+                        or float(data['csvMtime']) != os.path.getmtime(csvFile)
+                        or str(data['simulationName']) != simulationName):
+                    return None
+
+                parNames = [str(name) for name in data['parNames']]
+                simNums = data['SimNum']
+                uniqueVals = [data['unique%i' % idx] for idx in range(len(parNames))]
+                codes = data['codes']
+        except (OSError, KeyError, ValueError, EOFError, zipfile.BadZipFile):
+            # a half written or corrupt index is rebuilt
+            return None
+
+        index = BatchIndex(simNums, parNames, codes, uniqueVals)
+        index.simulationName = simulationName
+        return index
+
+    def save(self, indexFile, csvFile):
+        arrays = {'version': INDEX_VERSION,
+                  'parlistFile': os.path.basename(csvFile),
+                  'csvMtime': os.path.getmtime(csvFile),
+                  'simulationName': self.simulationName,
+                  'parNames': np.array(self.parNames, dtype=str),
+                  'SimNum': self.simNums,
+                  'codes': self.codes}
+        for idx in range(len(self.parNames)):
+            arrays['unique%i' % idx] = BatchIndex._to_array(self.uniqueVals[idx])
+
+        # write next to it and rename, readers never see a half written index.
+        # The batch folder may be read only, the index is then rebuilt every time
+        tmpFile = '%s.%i.tmp' % (indexFile, os.getpid())
+        try:
+            with open(tmpFile, 'wb') as f:
+                np.savez(f, **arrays)
+            os.replace(tmpFile, indexFile)
+        except OSError:
+            try:
+                os.remove(tmpFile)
+            except OSError:
+                pass
+
+    @staticmethod
+    def _to_array(values):
+        ''' plain numpy array that can be stored without pickling '''
+        values = np.asarray(values)
+        if values.dtype == object:
+            values = values.astype(str)
+        return values
+
+    @staticmethod
+    def build_codes(parData, parNames):
+        '''
+        factorizes every parameter column. Returns the code matrix
+        (rows x parameters) holding the index into the unique values of each
+        parameter, and the list of sorted unique values, so neighbours and
+        axes do not depend on the row order of the parameter list. The codes
+        use the smallest unsigned type that fits all parameters
+        '''
+        import pandas as pd
+        columns = [pd.factorize(parData[name].values, sort=True, use_na_sentinel=False)
+                   for name in parNames]
+        uniqueVals = [values for _, values in columns]
+        dtype = BatchIndex.code_dtype(max((len(values) for values in uniqueVals), default=1))
+        codes = np.empty((parData.shape[0], len(parNames)), dtype=dtype)
+        for idx, (colCodes, _) in enumerate(columns):
+            codes[:, idx] = colCodes
+        return codes, uniqueVals
+
+    @staticmethod
+    def code_dtype(numValues):
+        ''' smallest unsigned integer type for codes 0..numValues-1 '''
+        for dtype in (np.uint8, np.uint16, np.uint32):
+            if numValues <= np.iinfo(dtype).max + 1:
+                return dtype
+        return np.uint64
+
+    @staticmethod
+    def build_grid(codes, uniqueVals):
+        '''
+        builds an N-D array shaped by the number of unique values of each
+        parameter. Every cell holds the row index of the simulation with that
+        combination of values, or -1 if the combination was not simulated
+        '''
+        shape = tuple(len(values) for values in uniqueVals)
+        grid = np.full(shape, -1, dtype=np.int32)
+        grid[tuple(codes.T)] = np.arange(codes.shape[0], dtype=np.int32)
+        return grid
+
+    def getRowIndex(self, valIndices):
+        '''
+        row index for slider indices, -1 if the combination does not exist.
+        Also accepts an array of shape (n, parameters) and returns n rows
+        '''
+        valIndices = np.asarray(valIndices)
+        if self.grid is not None:
+            rows = self.grid[tuple(valIndices.T)]
+        else:
+            keys = np.ravel_multi_index(tuple(valIndices.T), self.shape)
+            pos = np.searchsorted(self.sortedKeys, keys)
+            pos = np.minimum(pos, self.numSims - 1)
+            rows = np.where(self.sortedKeys[pos] == keys, self.sortedRows[pos], -1)
+        if valIndices.ndim == 1:
+            return int(rows)
+        return rows
+
+    def getNearestRow(self, valIndices, rows=None):
+        '''
+        row index of the simulation nearest to valIndices in normalized index
+        space (every axis scaled to 0..1), for combinations that do not exist.
+        With rows, only those rows are candidates (e.g. the hits of a filter)
+        '''
+        if rows is not None:
+            # candidates change with every filter, not worth a tree
+            dist = ((self.codes[rows] - np.asarray(valIndices)) * self.axisScale()) ** 2
+            return int(rows[np.argmin(dist.sum(axis=1))])
+        if self.tree is None:
+            from scipy.spatial import cKDTree
+            self.tree = cKDTree(self.codes * self.axisScale())
+        _, row = self.tree.query(np.asarray(valIndices) * self.axisScale())
+        return int(row)
+
+    def axisScale(self):
+        return 1.0 / np.maximum(np.array(self.shape) - 1, 1)
+
+    def getValIndices(self, row_idx):
+        ''' slider indices of the simulation at row_idx '''
+        # as int, unsigned codes wrap around when stepping below 0
+        return self.codes[row_idx].astype(np.intp)
+
+    def getValues(self, parIdx, rows=None):
+        ''' values of parameter parIdx for rows, all rows by default '''
+        codes = self.codes[:, parIdx] if rows is None else self.codes[rows, parIdx]
+        return np.asarray(self.uniqueVals[parIdx])[codes]
+
+    def nbytes(self):
+        ''' memory used by the lookup arrays (without the nearest neighbour tree) '''
+        arrays = [self.simNums, self.codes, self.grid, self.sortedRows, self.sortedKeys]
+        arrays += [np.asarray(values) for values in self.uniqueVals]
+        return sum(a.nbytes for a in arrays if a is not None)
+
+    def getFile(self, kind, row_idx):
+        ''' path of the img, mat or gif file of the simulation at row_idx '''
+        return self.pathResolver.resolve(kind, self.simNums[row_idx])
+
+    def getFiles(self, kind, rows=None):
+        ''' paths of the img, mat or gif files for rows, all rows by default '''
+        simNums = self.simNums if rows is None else self.simNums[rows]
+        return self.pathResolver.resolve_all(kind, simNums)
+
+    def scan_files(self, kinds=('img', 'mat', 'gif')):
+        '''
+        checks which result files exist with one os.scandir per directory
+        instead of a stat per file. Directories that are not listed in their
+        parent are not scanned. Returns a dict kind -> bool array per row
+        '''
+        batchFolder = self.pathResolver.batchFolder
+        paths = {}
+        dirs = set()
+        for kind in kinds:
+            # resolved paths are joined with os.sep
+            paths[kind] = [p.rpartition(os.sep) for p in self.getFiles(kind).tolist()]
+            dirs.update(d for d, _, _ in paths[kind])
+
+        # add the parents up to the batch folder, so missing sim folders are skipped
+        for d in list(dirs):
+            d = d.rpartition(os.sep)[0]
+            while len(d) > len(batchFolder) and d not in dirs:
+                dirs.add(d)
+                d = d.rpartition(os.sep)[0]
+
+        # parents are shorter than their children, so scanned first
+        listing = {}
+        for d in sorted(dirs, key=len):
+            parent, _, name = d.rpartition(os.sep)
+            if parent in listing and name not in listing[parent]:
+                listing[d] = frozenset()
+                continue
+            try:
+                with os.scandir(d) as it:
+                    listing[d] = frozenset(entry.name for entry in it)
+            except OSError:
+                listing[d] = frozenset()
+
+        fileExists = {}
+        for kind in kinds:
+            fileExists[kind] = np.fromiter((name in listing[d] for d, _, name in paths[kind]),
+                                           dtype=bool, count=len(paths[kind]))
+        return fileExists
+
+    def hasFile(self, kind, row_idx):
+        ''' True or False if the files were scanned, None if not known yet '''
+        if self.fileExists is None:
+            return None
+        return bool(self.fileExists[kind][row_idx])
+
+    def getNeighbours(self, row_idx, depth=1):
+        '''
+        row indices of the simulations up to depth steps away from row_idx
+        along every parameter axis, and the previous and next sim numbers.
+        Ordered by distance, nearest first, without duplicates or row_idx
+        '''
+        valIndices = self.getValIndices(row_idx)
+        shape = self.shape
+        rows = []
+        for step in range(1, depth + 1):
+            for axis in range(len(shape)):
+                for sign in (1, -1):
+                    idx = valIndices[axis] + sign * step
+                    if 0 <= idx < shape[axis]:
+                        neighbour = valIndices.copy()
+                        neighbour[axis] = idx
+                        rows.append(self.getRowIndex(neighbour))
+            for neighbour in (row_idx + step, row_idx - step):
+                if 0 <= neighbour < self.numSims:
+                    rows.append(neighbour)
+
+        # remove missing combinations and duplicates, keep order
+        seen = {row_idx, -1}
+        result = []
+        for row in rows:
+            row = int(row)
+            if row not in seen:
+                seen.add(row)
+                result.append(row)
+        return result
@@ -0,0 +1,216 @@
+'''
+Filters the simulations of a batch with an expression like E > 1e3 and nu < 0.45
+
+Expressions are parsed with the python ast module and evaluated vectorized
+over all rows, they are never passed to eval. Names can be parameters of the
+parameter list, or fields of extra tables such as the extracted P table,
+written with their prefix (P.E, P.sub.a). A name that is not a parameter is
+also looked up in the tables without prefix.
+
+Comparisons of a parameter with a constant are evaluated on the unique values
+of the parameter and gathered with the code matrix, so most filters cost one
+integer indexing pass over the rows.
+'''
+import ast
+import functools
+import operator
+from abc import ABC, abstractmethod
+import numpy as np
+
+COMPARE_OPS = {
+    ast.Gt: operator.gt, ast.GtE: operator.ge, ast.Lt: operator.lt,
+    ast.LtE: operator.le, ast.Eq: operator.eq, ast.NotEq: operator.ne,
+}
+BINARY_OPS = {
+    ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul,
+    ast.Div: operator.truediv, ast.Pow: operator.pow, ast.Mod: operator.mod,
+}
+# name -> (function, number of arguments), a fixed count so the numpy
+# ufuncs cannot be passed an out array
+FUNCTIONS = {'abs': (np.abs, 1), 'log': (np.log, 1), 'log10': (np.log10, 1),
+             'sqrt': (np.sqrt, 1), 'isnan': (np.isnan, 1)}
+
+
+class ExpressionEvaluator(ABC):
+    '''
+    evaluates a parsed expression with numpy, names are looked up with
+    _column. Only the nodes below are allowed, anything else raises ValueError
+    '''
+    functions = FUNCTIONS
+
+    def _eval(self, node):
+        if isinstance(node, ast.BoolOp):
+            values = [self._eval(v) for v in node.values]
+            op = np.logical_and if isinstance(node.op, ast.And) else np.logical_or
+            try:
+                # pairwise, so columns and constants broadcast, e.g. E > 1 and True
+                return functools.reduce(op, values)
+            except (TypeError, ValueError) as e:
+                raise ValueError('invalid operands in expression: %s' % e)
+
+        if isinstance(node, ast.UnaryOp):
+            value = self._eval(node.operand)
+            if isinstance(node.op, ast.Not):
+                return np.logical_not(value)
+            if isinstance(node.op, ast.USub):
+                return -value
+            return value
+
+        if isinstance(node, ast.Compare):
+            result = None
+            left = node.left
+            for op, right in zip(node.ops, node.comparators):
+                if type(op) not in COMPARE_OPS:
+                    raise ValueError('unsupported comparison in expression')
+                mask = self._compare(left, COMPARE_OPS[type(op)], right)
+                result = mask if result is None else np.logical_and(result, mask)
+                left = right
+            return result
+
+        if isinstance(node, ast.BinOp):
+            if type(node.op) not in BINARY_OPS:
+                raise ValueError('unsupported operator in expression')
+            left, right = self._eval(node.left), self._eval(node.right)
+            try:
+                # huge powers and products overflow to inf
+                with np.errstate(over='ignore'):
+                    return BINARY_OPS[type(node.op)](left, right)
+            except TypeError as e:
+                # e.g. a text parameter in arithmetic
+                raise ValueError('invalid operands in expression: %s' % e)
+
+        if isinstance(node, ast.Call):
+            if not isinstance(node.func, ast.Name) or node.func.id not in self.functions:
+                raise ValueError('unknown function in expression')
+            function, numArgs = self.functions[node.func.id]
+            if node.keywords or len(node.args) != numArgs:
+                raise ValueError('%s takes %i argument%s' % (node.func.id, numArgs,
+                                                             '' if numArgs == 1 else 's'))
+            return function(*[self._eval(arg) for arg in node.args])
+
+        if isinstance(node, ast.Subscript):
+            value = np.asarray(self._eval(node.value))
+            try:
+                return value[self._index(node.slice)]
+            except IndexError as e:
+                raise ValueError('invalid index in expression: %s' % e)
+
+        if isinstance(node, ast.Constant):
+            return self._constant(node)
+
+        if isinstance(node, (ast.Name, ast.Attribute)):
+            return self._column(self._name(node))
+
+        raise ValueError('unsupported expression')
+
+    def _index(self, node):
+        ''' constant index or slice of a subscript, e.g. u[-1] or u[:, 0] '''
+        if isinstance(node, ast.Tuple):
+            return tuple(self._index(elt) for elt in node.elts)
+        if isinstance(node, ast.Slice):
+            return slice(*[None if n is None else self._integer(n)
+                           for n in (node.lower, node.upper, node.step)])
+        return self._integer(node)
+
+    def _integer(self, node):
+        value = self._eval(node)
+        # numbers are floats, see _constant
+        if not isinstance(value, float) or not value.is_integer():
+            raise ValueError('index in expression must be an integer constant')
+        return int(value)
+
+    @staticmethod
+    def _constant(node):
+        # no strings, bytes or complex numbers, numpy cannot compare them to the columns
+        if isinstance(node.value, bool):
+            return node.value
+        if isinstance(node.value, (int, float)):
+            # as floats, huge powers like 10**10**10 overflow to inf instead
+            # of computing an endless python int
+            try:
+                return np.float64(node.value)
+            except OverflowError:
+                return np.float64(np.inf)
+        raise ValueError('unsupported constant in expression: %r' % (node.value,))
+
+    def _compare(self, left, op, right):
+        return self._apply(op, self._eval(left), self._eval(right))
+
+    @staticmethod
+    def _apply(op, left, right):
+        try:
+            return op(left, right)
+        except TypeError as e:
+            # e.g. a text parameter against a number
+            raise ValueError('invalid comparison in expression: %s' % e)
+
+    def _name(self, node):
+        ''' dotted name of a Name or Attribute node '''
+        if isinstance(node, ast.Name):
+            return node.id
+        if isinstance(node, ast.Attribute):
+            return self._name(node.value) + '.' + node.attr
+        raise ValueError('unsupported name in expression')
+
+    @abstractmethod
+    def _column(self, name):
+        ''' values of a name in the expression '''
+
+    @staticmethod
+    def parse(expression):
+        try:
+            return ast.parse(expression.strip(), mode='eval').body
+        except SyntaxError as e:
+            raise ValueError('invalid expression: %s' % e.msg)
+
+
+class BatchQuery(ExpressionEvaluator):
+    def __init__(self, batchIndex, tables=None):
+        '''
+        tables maps a prefix to a ParameterTable, e.g. {'P': parameterTable}
+        '''
+        self.batchIndex = batchIndex
+        self.numSims = batchIndex.numSims
+        self.parIndex = {name: idx for idx, name in enumerate(batchIndex.parNames)}
+
+        # columns of the extra tables, aligned to the rows of the batch
+        self.columns = {'SimNum': np.asarray(batchIndex.simNums, dtype=float)}
+        # the same columns without prefix, the first table wins
+        self.aliases = {}
+        for prefix, table in (tables or {}).items():
+            if table is None:
+                continue
+            values = table.align(batchIndex.simNums)
+            for col, name in enumerate(table.names):
+                self.columns['%s.%s' % (prefix, name)] = values[:, col]
+                self.aliases.setdefault(name, values[:, col])
+
+    def names(self):
+        return list(self.parIndex) + list(self.columns)
+
+    def evaluate(self, expression):
+        ''' bool array with the rows that match expression '''
+        result = self._eval(self.parse(expression))
+        result = np.broadcast_to(np.asarray(result, dtype=bool), (self.numSims,))
+        return np.array(result)
+
+    def _compare(self, left, op, right):
+        # parameter against constant: compare the unique values, gather with the codes
+        for par, const, flip in ((left, right, False), (right, left, True)):
+            if (isinstance(par, ast.Name) and par.id in self.parIndex
+                    and isinstance(const, ast.Constant)):
+                idx = self.parIndex[par.id]
+                values = np.asarray(self.batchIndex.uniqueVals[idx])
+                value = self._constant(const)
+                lut = self._apply(op, value, values) if flip else self._apply(op, values, value)
+                return np.asarray(lut, dtype=bool)[self.batchIndex.codes[:, idx]]
+        return ExpressionEvaluator._compare(self, left, op, right)
+
+    def _column(self, name):
+        if name in self.parIndex:
+            return self.batchIndex.getValues(self.parIndex[name])
+        if name in self.columns:
+            return self.columns[name]
+        if name in self.aliases:
+            return self.aliases[name]
+        raise ValueError('unknown name in filter: %s' % name)
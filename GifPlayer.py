@@ -1,71 +1,422 @@
-from PyQt5.QtWidgets import QWidget, QLabel, QVBoxLayout, QSizePolicy, QApplication, QGridLayout, QFrame, QShortcut
-from PyQt5.QtGui import QMovie, QKeySequence
-from PyQt5.QtCore import QDir, Qt, QSize, QByteArray
+'''
+Widget to play the gif animations of a simulation
+
+By default gifs are streamed: a reader thread decodes the frames just ahead of
+the playhead into a small bounded queue, scaled down to the size of the
+widget, so memory does not grow with the number of frames. Seeking uses an
+index of the byte offset of every frame, decoding starts at the nearest
+keyframe before the target (a frame that covers the whole image and has no
+transparency, it does not depend on the frames before it).
+Gifs that are likely to be shown next can be preloaded, their first frames
+are decoded before they are needed.
+With streaming=False the whole gif is decoded once and cached by QMovie.
+'''
+import os
+import struct
+import queue
+import threading
+from PyQt5.QtWidgets import QWidget, QLabel, QVBoxLayout, QSizePolicy, QApplication, QShortcut, QSlider
+from PyQt5.QtGui import QMovie, QKeySequence, QImageReader, QPixmap
+from PyQt5.QtCore import Qt, QByteArray, QIODevice, QTimer
+
+GIF_TRAILER = 0x3B
+GIF_EXTENSION = 0x21
+GIF_IMAGE = 0x2C
+GIF_GRAPHIC_CONTROL = 0xF9
+
+# frame delay used for gifs without (or with a tiny) delay, like browsers do
+DEFAULT_DELAY_MS = 100
+
+
+class GifIndex:
+    '''
+    byte offset, delay and keyframe flag of every frame of a gif, parsed from
+    the block structure of the open file f without decoding any pixels or
+    reading the image data. A truncated gif is indexed up to its last complete
+    frame
+    '''
+
+    def __init__(self, f):
+        f.seek(0, os.SEEK_END)
+        self.size = f.tell()
+        f.seek(0)
+        data = f.read(13)
+        if data[:6] not in (b'GIF87a', b'GIF89a'):
+            raise ValueError('not a gif file')
+        if len(data) < 13:
+            raise ValueError('truncated gif file')
+        self.width, self.height, packed = struct.unpack('<HHB', data[6:11])
+        if packed & 0x80:
+            f.seek(3 * 2 ** ((packed & 7) + 1), os.SEEK_CUR)
+
+        self.offsets = []
+        self.delays = []
+        self.keyframes = []
+        frameStart = None
+        delay = 0
+        transparent = False
+        while True:
+            pos = f.tell()
+            block = f.read(1)
+            if not block:
+                break
+            if block[0] == GIF_EXTENSION:
+                data = f.read(5)
+                if len(data) < 5:
+                    break
+                if data[0] == GIF_GRAPHIC_CONTROL:
+                    # the graphic control extension belongs to the next frame
+                    frameStart = pos
+                    flags, delay = struct.unpack('<BH', data[2:5])
+                    transparent = bool(flags & 1)
+                f.seek(pos + 2)
+                GifIndex._skip_sub_blocks(f)
+            elif block[0] == GIF_IMAGE:
+                data = f.read(9)
+                if len(data) < 9:
+                    break
+                left, top, width, height, packed = struct.unpack('<HHHHB', data)
+                start = pos if frameStart is None else frameStart
+                if packed & 0x80:
+                    f.seek(3 * 2 ** ((packed & 7) + 1), os.SEEK_CUR)
+                # lzw minimum code size, then the image data
+                f.seek(1, os.SEEK_CUR)
+                if not GifIndex._skip_sub_blocks(f) or f.tell() > self.size:
+                    break  # the data of the last frame is cut off
+                self.offsets.append(start)
+                self.delays.append(delay * 10 if delay >= 2 else DEFAULT_DELAY_MS)
+                self.keyframes.append(not self.offsets[:-1] or (
+                    not transparent and left == 0 and top == 0
+                    and width == self.width and height == self.height))
+                frameStart = None
+                delay = 0
+                transparent = False
+            else:
+                break  # trailer, or a truncated file
+
+        # everything up to the first frame: screen descriptor, color table, loop extension
+        f.seek(0)
+        self.header = f.read(self.offsets[0]) if self.offsets else f.read()
+
+    @staticmethod
+    def _skip_sub_blocks(f):
+        ''' skips to after the terminator, False if the file ends before it '''
+        while True:
+            length = f.read(1)
+            if not length:
+                return False
+            if not length[0]:
+                return True
+            f.seek(length[0], os.SEEK_CUR)
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def keyframe_before(self, frame):
+        while frame > 0 and not self.keyframes[frame]:
+            frame -= 1
+        return frame
+
+
+class GifFrameDevice(QIODevice):
+    '''
+    read-only device of a gif made of the header and the frames from a byte
+    offset on, read from the open file f as the decoder asks for them
+    '''
+
+    def __init__(self, header, f, offset, fileSize):
+        super(GifFrameDevice, self).__init__()
+        self.header = header
+        self.file = f
+        self.offset = offset
+        self.numBytes = fileSize - offset
+        # unbuffered, so pos() is where readData continues
+        self.open(QIODevice.ReadOnly | QIODevice.Unbuffered)
+
+    def size(self):
+        return len(self.header) + self.numBytes
+
+    def readData(self, maxlen):
+        pos = self.pos()
+        chunk = self.header[pos:pos + maxlen]
+        start = max(0, pos - len(self.header))
+        numBytes = min(maxlen - len(chunk), self.numBytes - start)
+        if numBytes > 0:
+            self.file.seek(self.offset + start)
+            chunk += self.file.read(numBytes)
+        return chunk
+
+    def writeData(self, data):
+        return -1
+
+
+class GifFrameReader:
+    ''' decodes the frames of a gif in the open file f in order, starting from any frame '''
+
+    def __init__(self, f, index):
+        self.file = f
+        self.index = index
+        self.reader = None
+        self.device = None
+        self.frame = 0
+
+    def seek(self, frame):
+        keyframe = self.index.keyframe_before(frame)
+        # forward from the current frame if no keyframe is in between
+        if self.reader is None or not keyframe <= self.frame <= frame:
+            # a gif of the header and the frames from the keyframe on
+            self.device = GifFrameDevice(self.index.header, self.file,
+                                         self.index.offsets[keyframe], self.index.size)
+            self.reader = QImageReader(self.device, b'gif')
+            self.frame = keyframe
+        while self.frame < frame:
+            if self.reader.read().isNull():
+                break
+            self.frame += 1
+
+    def read(self, size=None):
+        ''' (frame number, image) of the next frame, scaled to fit in size '''
+        if self.reader is None or self.frame >= len(self.index):
+            self.seek(0)
+        image = self.reader.read()
+        frame = self.frame
+        self.frame += 1
+        if image.isNull():
+            return frame, image
+        if size is not None and (image.width() > size.width() or image.height() > size.height()):
+            image = image.scaled(size, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+        return frame, image
+
+
+class GifStream:
+    '''
+    reads a gif and decodes frames ahead on a reader thread into a queue of
+    at most bufferSize frames, looping at the end. Seeking drops the queued
+    frames
+    '''
+
+    def __init__(self, fileName, bufferSize=8, scaledSize=None):
+        self.fileName = fileName
+        self.index = None
+        self.error = None
+        self.frames = queue.Queue(bufferSize)
+        self.scaledSize = scaledSize
+        self.generation = 0
+        self.seekTo = 0
+        self.lock = threading.Lock()
+        self.stopped = False
+        self.thread = threading.Thread(target=self._produce, daemon=True)
+        self.thread.start()
+
+    def __len__(self):
+        return len(self.index) if self.index is not None else 0
+
+    def seek(self, frame):
+        with self.lock:
+            self.generation += 1
+            self.seekTo = frame
+
+    def take(self):
+        ''' (frame number, image) of the next frame, None if it is not decoded yet '''
+        while True:
+            try:
+                generation, frame, image = self.frames.get_nowait()
+            except queue.Empty:
+                return None
+            if generation == self.generation:
+                return frame, image
+
+    def stop(self, wait=False):
+        self.stopped = True
+        if wait:
+            self.thread.join()
+
+    def _produce(self):
+        try:
+            self._decode()
+        except Exception as e:
+            # the player waits for frames until there is an error
+            self.error = str(e) or repr(e)
+
+    def _decode(self):
+        # the file is indexed here too, so preloading never blocks the gui.
+        # Frames are read from the file as they are decoded, never all of it
+        with open(self.fileName, 'rb') as f:
+            self._stream(f)
+
+    def _stream(self, f):
+        self.index = GifIndex(f)
+        if not len(self.index):
+            self.error = 'no frames in %s' % self.fileName
+            return
+
+        reader = GifFrameReader(f, self.index)
+        while not self.stopped:
+            with self.lock:
+                generation = self.generation
+                seekTo, self.seekTo = self.seekTo, None
+                size = self.scaledSize
+            if seekTo is not None:
+                reader.seek(seekTo)
+            item = (generation,) + reader.read(size)
+            # wait for room in the queue, unless a seek makes this frame stale
+            while not self.stopped and generation == self.generation:
+                try:
+                    self.frames.put(item, timeout=0.05)
+                    break
+                except queue.Full:
+                    pass
 
 
 class GifPlayer(QWidget):
-    def __init__(self, hsize, vsize, parent=None):
+    def __init__(self, hsize, vsize, parent=None, streaming=True, bufferSize=8):
         super(GifPlayer, self).__init__(parent)
 
         # set size and title
         self.resize(hsize, vsize)
         self.setWindowTitle('Gif Viewer')
+        self.streaming = streaming
+        self.bufferSize = bufferSize
+        self.fileName = None
+        self.stream = None
+        self.gif = None
+        # streams of gifs that are likely to be loaded next, already decoding
+        self.preloaded = {}
 
-        # create frame
-        # self.layout = QGridLayout()
-        self.frame = QFrame(self)
-        # self.frame.setLayout(self.layout)
-
-        # label for movie
-        self.gif_label = QLabel(self.frame)
-        self.gif_label.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
+        # label for movie, slider to seek
+        self.gif_label = QLabel(self)
+        self.gif_label.setSizePolicy(QSizePolicy.Ignored, QSizePolicy.Ignored)
         self.gif_label.setAlignment(Qt.AlignCenter)
+        self.frame_slider = QSlider(Qt.Horizontal, self)
+        self.frame_slider.sliderMoved.connect(self.seek)
+
+        layout = QVBoxLayout(self)
+        layout.addWidget(self.gif_label)
+        layout.addWidget(self.frame_slider)
+        layout.setContentsMargins(1, 1, 1, 1)
 
-        # add stuff to layout
-        # self.layout.addWidget(self.gif_label, 0, 0, 1, 1)
-        # self.layout.setContentsMargins(1, 1, 1, 1)
+        # shows the next frame of a stream when its delay has passed
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.nextFrame)
 
         # create actions / shortcuts
         self.createActions()
 
-        # Load the file into a QMovie
-        # size = self.movie.scaledSize()
-        # self.setGeometry(200, 200, size.width(), size.height())
-        # self.setWindowTitle(title)
+    def scaledSize(self):
+        return self.gif_label.size() if self.isVisible() else None
 
     def load_gif(self, fileName):
-        self.gif = QMovie(fileName, QByteArray(), self.gif_label)
+        if not self.streaming:
+            self.stop()
+            self.fileName = fileName
+            self.gif = QMovie(fileName, QByteArray(), self.gif_label)
+            self.gif.setCacheMode(QMovie.CacheAll)
+            self.gif.setSpeed(100)
+            self.gif_label.setMovie(self.gif)
+            self.gif.frameChanged.connect(self.frame_slider.setValue)
+            self.gif.start()
+            self.frame_slider.setRange(0, max(self.gif.frameCount() - 1, 0))
+            return
 
-        self.gif.setCacheMode(QMovie.CacheAll)
-        self.gif.setSpeed(100)
-        self.gif_label.setMovie(self.gif)
+        # keep the current stream around, going back to it is likely
+        self.timer.stop()
+        if self.stream is not None:
+            self.stream.seek(0)
+            self.preloaded[self.fileName] = self.stream
+        self.fileName = fileName
+        self.stream = self.preloaded.pop(fileName, None)
+        if self.stream is None:
+            self.stream = GifStream(fileName, self.bufferSize, self.scaledSize())
+        self.stream.scaledSize = self.scaledSize()
+        self.frame_slider.setRange(0, max(len(self.stream) - 1, 0))
+        self.timer.start(0)
 
-        # gif_size = self.gif.scaledSize()
-        # print(gif_size)
+    def preload(self, fileNames):
+        '''
+        start decoding the first frames of fileNames in the background, so
+        loading them is instant. Replaces the previous preloaded gifs
+        '''
+        if not self.streaming:
+            return
+        for fileName in list(self.preloaded):
+            if fileName not in fileNames:
+                self.preloaded.pop(fileName).stop()
+        for fileName in fileNames:
+            if fileName not in self.preloaded and fileName != self.fileName:
+                self.preloaded[fileName] = GifStream(fileName, self.bufferSize, self.scaledSize())
 
-        # self.gif_asp_ratio =
+    def showMessage(self, text):
+        ''' stop playing and show text instead '''
+        self.stop()
+        self.gif_label.setText(text)
 
-        # gif_size = self.gif.scaledSize()
-        # self.gif_label.setFixedHeight(gif_size.height())
-        # self.gif_label.setFixedWidth(gif_size.width())
+    def stop(self):
+        self.timer.stop()
+        self.fileName = None
+        if self.stream is not None:
+            self.stream.stop()
+            self.stream = None
+        if self.gif is not None:
+            self.gif.stop()
+            self.gif = None
 
-        self.gif.start()
+    def clear(self):
+        ''' stop playing and drop the preloaded gifs, waits for their threads '''
+        streams = [self.stream] + list(self.preloaded.values())
+        self.stop()
+        self.preloaded.clear()
+        for stream in streams:
+            if stream is not None:
+                stream.stop(wait=True)
 
-    # def fix_size(self):
-    #     screen_size = self.geometry()
-    #     gif_size = self.gif.scaledSize()
+    def seek(self, frame):
+        ''' continue playing from frame '''
+        if self.stream is not None:
+            self.stream.seek(frame)
+            self.timer.start(0)
+        elif self.gif is not None:
+            self.gif.jumpToFrame(frame)
 
-    #     print(screen_size)
-    #     print(gif_size)
+    def nextFrame(self):
+        stream = self.stream
+        frame = stream.take()
+        if frame is None:
+            if stream.error or not stream.thread.is_alive():
+                self.showMessage(stream.error or 'stopped reading %s' % stream.fileName)
+                return
+            # not decoded yet, try again soon
+            self.timer.start(5)
+            return
+        frame, image = frame
+        if not image.isNull():
+            self.gif_label.setPixmap(QPixmap.fromImage(image))
+        if self.frame_slider.maximum() != len(stream) - 1:
+            self.frame_slider.setRange(0, len(stream) - 1)
+        if not self.frame_slider.isSliderDown():
+            self.frame_slider.setValue(frame)
+        self.timer.start(stream.index.delays[frame])
 
     def createActions(self):
         self.close_window_shortcut = QShortcut(QKeySequence("Ctrl+W"), self)
-        self.close_window_shortcut.activated.connect(self.close)
+        self.close_window_shortcut.setContext(Qt.WidgetWithChildrenShortcut)
+        self.close_window_shortcut.activated.connect(self.closePlayer)
+
+    def closePlayer(self):
+        # embedded, close the dock or window around the player
+        (self if self.isWindow() else self.parentWidget()).close()
+
+    def resizeEvent(self, event):
+        super(GifPlayer, self).resizeEvent(event)
+        # decode the next frames at the new size
+        size = self.scaledSize()
+        for stream in [self.stream] + list(self.preloaded.values()):
+            if stream is not None:
+                stream.scaledSize = size
 
-    # def resizeEvent(self, event):
-    #     self.gif.setScaledSize(QSize(1000, 1000))
-    #     self.gif_label.setFixedSize(1000, 1000)
-    #     self.fix_size()
+    def closeEvent(self, event):
+        self.clear()
+        super(GifPlayer, self).closeEvent(event)
 
 
 if __name__ == "__main__":
@@ -74,7 +425,7 @@ if __name__ == "__main__":
     app = QApplication(sys.argv)
     player = GifPlayer(800, 600)
     player.show()
-    player.load_gif('test.gif')
+    player.load_gif(sys.argv[1] if len(sys.argv) > 1 else gif)
     player.show()
 
     sys.exit(app.exec_())
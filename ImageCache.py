@@ -0,0 +1,97 @@
+'''
+Memory bounded least recently used cache for decoded images and pixmaps
+
+The budget is a number of bytes, or a number of entries for values whose size
+does not matter, like the parsed P structs.
+'''
+import os
+from collections import OrderedDict
+
+
+class ImageCache:
+    def __init__(self, maxBytes=None, maxEntries=None):
+        # None is no limit
+        self.maxBytes = maxBytes
+        self.maxEntries = maxEntries
+        self.numBytes = 0
+        # key -> (mtime, value, nbytes), most recently used last
+        self.entries = OrderedDict()
+
+        # counters to size the budget
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def getmtime(fileName):
+        ''' modification time of fileName, None if it cannot be read '''
+        try:
+            return os.path.getmtime(fileName)
+        except OSError:
+            return None
+
+    @staticmethod
+    def imageBytes(image):
+        ''' memory used by a QImage or QPixmap '''
+        return image.width() * image.height() * image.depth() // 8
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key, mtime=None):
+        '''
+        returns the cached value for key, or None. If mtime is given the entry
+        is only valid when it was stored with the same mtime
+        '''
+        entry = self.entries.get(key)
+        if entry is None or entry[0] != mtime:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def lookup(self, key):
+        '''
+        (mtime, value) of the cached entry for key, or None. The mtime is not
+        checked, so the caller can check it later off the GUI thread
+        '''
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[0], entry[1]
+
+    def put(self, key, value, nbytes=0, mtime=None):
+        if key in self.entries:
+            self.numBytes -= self.entries.pop(key)[2]
+        if self.maxBytes is not None and nbytes > self.maxBytes:
+            return  # would evict everything else
+        self.entries[key] = (mtime, value, nbytes)
+        self.numBytes += nbytes
+
+        # evict least recently used until within budget
+        while ((self.maxBytes is not None and self.numBytes > self.maxBytes)
+               or (self.maxEntries is not None and len(self.entries) > self.maxEntries)):
+            _, (_, _, oldBytes) = self.entries.popitem(last=False)
+            self.numBytes -= oldBytes
+            self.evictions += 1
+
+    def clear(self):
+        self.entries.clear()
+        self.numBytes = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {'entries': len(self.entries),
+                'MB': self.numBytes / 2**20,
+                'budget MB': self.maxBytes / 2**20 if self.maxBytes is not None else None,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit rate': self.hits / lookups if lookups else 0.0}
@@ -0,0 +1,229 @@
+'''
+Decodes images on a worker thread pool and hands them back to the GUI thread
+
+Only the most recent request is ever delivered: requests that are still queued
+when a new one comes in are cancelled, and results of requests that were
+already decoding are dropped when they arrive.
+
+Images that are likely to be requested next can be prefetched. They are
+decoded at a lower priority. All decoded images are kept in an ImageCache
+keyed by path, so revisiting a file does not decode it again. Cached images
+are delivered right away and a worker checks the mtime afterwards, a file
+that changed is decoded and delivered again.
+
+With a PreviewCache, images can be requested as preview: the workers look up
+the largest preview and decode that instead, together with the size of the
+full image read from its header, so the GUI thread never touches the disk.
+'''
+from PyQt5.QtGui import QImage, QImageReader
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+from ImageCache import ImageCache
+
+REQUEST_PRIORITY = 1
+PREFETCH_PRIORITY = 0
+
+
+def decode_image(fileName, previewCache=None):
+    '''
+    (image, full size) of fileName. With a previewCache the largest preview
+    is decoded if there is one, the full size is then read from the header of
+    fileName. The full size is None when the image itself was decoded
+    '''
+    if previewCache is not None:
+        preview = previewCache.lookup(fileName)
+        if preview is not None:
+            image = QImage(preview)
+            # removed by another session after the lookup
+            if not image.isNull():
+                return image, QImageReader(fileName).size()
+    return QImage(fileName), None
+
+
+class ImageDecodeTask(QRunnable):
+    def __init__(self, loader, requestId, key, cachedMtime=None):
+        super(ImageDecodeTask, self).__init__()
+        self.loader = loader
+        self.requestId = requestId
+        self.key = key
+        # mtime of the cached image that was delivered already
+        self.cachedMtime = cachedMtime
+
+    def run(self):
+        # skip decoding if a newer request came in while this one was queued
+        mtime = None
+        if self.requestId != self.loader.latestId:
+            image, fullSize = QImage(), None
+        else:
+            mtime = ImageCache.getmtime(self.key[0])
+            if self.cachedMtime is not None and mtime == self.cachedMtime:
+                self.loader.unchanged.emit(self)
+                return
+            image, fullSize = self.loader.decode(self.key)
+        self.loader.decoded.emit(self, self.requestId, self.key, mtime, image, fullSize)
+
+
+class ImagePrefetchTask(QRunnable):
+    def __init__(self, loader, key):
+        super(ImagePrefetchTask, self).__init__()
+        self.loader = loader
+        self.key = key
+
+    def run(self):
+        # skip decoding if the file is no longer wanted
+        loader = self.loader
+        mtime = None
+        if self.key not in loader.wanted and self.key != loader.requested:
+            image, fullSize = QImage(), None
+        else:
+            mtime = ImageCache.getmtime(self.key[0])
+            image, fullSize = loader.decode(self.key)
+        self.loader.prefetched.emit(self.key, mtime, image, fullSize)
+
+
+class ImageLoader(QObject):
+    # emitted from the worker threads, delivered queued in the GUI thread
+    decoded = pyqtSignal(object, int, object, object, QImage, object)
+    prefetched = pyqtSignal(object, object, QImage, object)
+    unchanged = pyqtSignal(object)
+
+    # public signals, only for the latest request. The full size is None
+    # when the image is not a preview
+    imageLoaded = pyqtSignal(str, QImage, object)
+    imageFailed = pyqtSignal(str)
+
+    def __init__(self, numWorkers=2, cacheBytes=512 * 2**20, parent=None):
+        super(ImageLoader, self).__init__(parent)
+        self.pool = QThreadPool()
+        self.pool.setMaxThreadCount(numWorkers)
+        self.latestId = 0
+        # (fileName, preview) of the request that is not delivered yet
+        self.requested = None
+        # keep the tasks alive until they reported back, a queued task that
+        # is not referenced anymore is deleted while the pool still holds it
+        self.tasks = set()
+        self.prefetchTasks = {}
+        # decoded images, and the files that may be requested soon
+        self.cache = ImageCache(cacheBytes)
+        self.wanted = frozenset()
+        self.previewCache = None
+        self.decoded.connect(self._onDecoded)
+        self.prefetched.connect(self._onPrefetched)
+        self.unchanged.connect(self._onUnchanged)
+
+    def _key(self, fileName, preview):
+        # without previews there is only the image itself
+        return (fileName, bool(preview) and self.previewCache is not None)
+
+    def decode(self, key):
+        fileName, preview = key
+        return decode_image(fileName, self.previewCache if preview else None)
+
+    def isRequested(self, fileName, preview=False):
+        ''' True if fileName is requested and not delivered yet '''
+        return self.requested == self._key(fileName, preview)
+
+    def request(self, fileName, preview=False):
+        '''
+        decode fileName in the background, replacing any older request. With
+        preview, its largest preview is decoded instead if there is one
+        '''
+        # cancel older requests that no worker picked up yet
+        self.cancel()
+        key = self._key(fileName, preview)
+        self.requested = key
+
+        # served from memory, a worker checks afterwards if the file changed.
+        # The check starts first, slots may request another image right away
+        entry = self.cache.lookup(key)
+        if entry is not None:
+            mtime, (image, fullSize) = entry
+            self.requested = None
+            self._startDecode(key, mtime)
+            self.imageLoaded.emit(fileName, image, fullSize)
+            return
+
+        # already being prefetched, delivered when that finishes
+        if key in self.prefetchTasks:
+            return
+
+        self._startDecode(key)
+
+    def cancel(self):
+        ''' drop the current request, e.g. when there is nothing to show '''
+        self.latestId += 1
+        self.requested = None
+        for task in list(self.tasks):
+            if self.pool.tryTake(task):
+                self.tasks.discard(task)
+
+    def _startDecode(self, key, cachedMtime=None):
+        task = ImageDecodeTask(self, self.latestId, key, cachedMtime)
+        task.setAutoDelete(False)
+        self.tasks.add(task)
+        self.pool.start(task, REQUEST_PRIORITY)
+
+    def _deliver(self, key, mtime, image, fullSize):
+        self.requested = None
+        if image.isNull():
+            self.imageFailed.emit(key[0])
+        else:
+            self._store(key, mtime, image, fullSize)
+            self.imageLoaded.emit(key[0], image, fullSize)
+
+    def _store(self, key, mtime, image, fullSize):
+        self.cache.put(key, (image, fullSize), ImageCache.imageBytes(image), mtime)
+
+    def prefetch(self, fileNames, preview=False):
+        '''
+        decode fileNames in the background, nearest first. Replaces the
+        previous prefetch set: queued decodes outside of it are cancelled.
+        Files that are already cached are not checked for changes here, that
+        happens when they are requested
+        '''
+        keys = [self._key(f, preview) for f in fileNames]
+        keys = [key for key in keys if key != self.requested]
+        self.wanted = frozenset(keys)
+
+        # cancel queued decodes that are not wanted anymore
+        keep = self.wanted | {self.requested}
+        for key, task in list(self.prefetchTasks.items()):
+            if key not in keep and self.pool.tryTake(task):
+                del self.prefetchTasks[key]
+
+        for key in keys:
+            if key in self.cache or key in self.prefetchTasks:
+                continue
+            task = ImagePrefetchTask(self, key)
+            task.setAutoDelete(False)
+            self.prefetchTasks[key] = task
+            self.pool.start(task, PREFETCH_PRIORITY)
+
+    def _onDecoded(self, task, requestId, key, mtime, image, fullSize):
+        self.tasks.discard(task)
+        if requestId != self.latestId:
+            return  # stale result
+        self._deliver(key, mtime, image, fullSize)
+
+    def _onUnchanged(self, task):
+        self.tasks.discard(task)
+
+    def _onPrefetched(self, key, mtime, image, fullSize):
+        self.prefetchTasks.pop(key, None)
+        if key == self.requested:
+            # the latest request was waiting for this prefetch
+            if image.isNull():
+                # it may have been skipped just before it was requested
+                self._startDecode(key)
+            else:
+                self._deliver(key, mtime, image, fullSize)
+        elif key in self.wanted and not image.isNull():
+            self._store(key, mtime, image, fullSize)
+
+    def shutdown(self):
+        self.latestId += 1
+        self.wanted = frozenset()
+        self.pool.clear()
+        self.pool.waitForDone()
+        self.tasks.clear()
+        self.prefetchTasks.clear()
+        self.cache.clear()
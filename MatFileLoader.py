@@ -1,29 +1,447 @@
-import scipy.io as spio
+import io
+import os
+import struct
+import threading
+import zlib
+from collections.abc import Mapping
+import numpy as np
+from ImageCache import ImageCache
+
+# scipy.io and h5py take long to import, they are imported on the first load
+spio = None
+mat_struct = None
+h5py = None
+
+# data types of top level elements in v5 mat files
+miMATRIX = 14
+miCOMPRESSED = 15
+
+# bytes of a variable needed to read its name
+NAME_BYTES = 512
+
+# v7.3 mat files are HDF5 files behind a 512 byte header
+HDF5_SIGNATURE = b'\x89HDF\r\n\x1a\n'
+
+# with lazy loading, v7.3 arrays with more elements than this are not read
+LAZY_MIN_SIZE = 4096
+
+# variable directories of the most recently read files
+DIRECTORY_CACHE_ENTRIES = 1024
+
+
+def _import_scipy():
+    global spio, mat_struct
+    if spio is None:
+        import scipy.io
+        try:
+            from scipy.io.matlab import mat_struct
+        except ImportError:
+            from scipy.io.matlab.mio5_params import mat_struct
+        spio = scipy.io
+
+
+def _import_h5py():
+    # optional, only needed for v7.3 files
+    global h5py
+    if h5py is None:
+        try:
+            import h5py
+        except ImportError:
+            return False
+    return True
+
+
+class LazyStruct(Mapping):
+    '''
+    read only dict view of a mat_struct. Nested structs are converted when
+    they are accessed instead of all at once
+    '''
+
+    def __init__(self, matobj):
+        self._matobj = matobj
+        self._converted = {}
+
+    def __getitem__(self, key):
+        if key in self._converted:
+            return self._converted[key]
+        if key not in self._matobj._fieldnames:
+            raise KeyError(key)
+        elem = self._matobj.__dict__[key]
+        if isinstance(elem, mat_struct):
+            elem = LazyStruct(elem)
+            self._converted[key] = elem
+        return elem
+
+    def __iter__(self):
+        return iter(self._matobj._fieldnames)
+
+    def __len__(self):
+        return len(self._matobj._fieldnames)
+
+
+class LazyGroup(Mapping):
+    '''
+    read only dict view of a struct in a v7.3 mat file. Fields are read from
+    the file when they are accessed
+    '''
+
+    def __init__(self, group):
+        self._group = group
+        self._fields = MatFileLoader._h5_fields(group)
+        self._converted = {}
+
+    def __getitem__(self, key):
+        if key not in self._converted:
+            if key not in self._fields:
+                raise KeyError(key)
+            self._converted[key] = MatFileLoader._h5_convert(self._group[key], lazy=True)
+        return self._converted[key]
+
+    def __iter__(self):
+        return iter(self._fields)
+
+    def __len__(self):
+        return len(self._fields)
+
+
+class LazyDataset:
+    '''
+    read only array view of a chunked or compressed dataset in a v7.3 mat
+    file, in MATLAB order and squeezed like the arrays loadmat returns.
+    Indexing with integers and slices reads only the selected part
+    '''
+
+    def __init__(self, dataset, matlabClass=''):
+        self._dataset = dataset
+        self._matlabClass = matlabClass
+        # HDF5 stores the dimensions reversed, singleton ones are dropped
+        self._axes = [axis for axis in reversed(range(dataset.ndim)) if dataset.shape[axis] != 1]
+        self.shape = tuple(dataset.shape[axis] for axis in self._axes)
+        self.ndim = len(self.shape)
+        self.size = dataset.size
+        self.dtype = MatFileLoader._h5_values(np.empty(0, dataset.dtype), matlabClass).dtype
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __array__(self, dtype=None, copy=None):
+        data = self._read(())
+        return data if dtype is None else data.astype(dtype)
+
+    def __getitem__(self, key):
+        key = key if isinstance(key, tuple) else (key,)
+        ellipsis = [pos for pos, k in enumerate(key) if k is Ellipsis]
+        if ellipsis:
+            pos = ellipsis[0]
+            key = key[:pos] + (slice(None),) * (self.ndim - len(key) + 1) + key[pos + 1:]
+        basic = all(isinstance(k, (int, np.integer)) or (isinstance(k, slice) and (k.step or 1) > 0)
+                    for k in key)
+        if not basic or len(key) > self.ndim:
+            # fancy indexing, read everything
+            return np.asarray(self)[key]
+        key = key + (slice(None),) * (self.ndim - len(key))
+        selection = [0] * self._dataset.ndim
+        for axis, k in zip(self._axes, key):
+            selection[axis] = k
+        return self._read(tuple(selection))
+
+    def _read(self, selection):
+        if not selection:
+            data = self._dataset[()]
+            data = data.reshape([n for n in data.shape if n != 1])
+        else:
+            data = self._dataset[selection]
+        # the remaining dimensions are in HDF5 order
+        data = MatFileLoader._h5_values(data, self._matlabClass).T
+        return data.item() if data.shape == () else data
+
+    def __repr__(self):
+        return '<LazyDataset shape %s, %s>' % (self.shape, self.dtype)
+
+
+class MatData(dict):
+    '''
+    variables of a lazily loaded mat file. The arrays and structs of a v7.3
+    file read from the open file, close it (or use a with block) when they
+    are no longer needed. Memory maps stay valid after closing
+    '''
+
+    def __init__(self, data, file=None):
+        super(MatData, self).__init__(data)
+        self.file = file
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
 
 
 class MatFileLoader:
+    # filename -> {name: (offset, nbytes)}, stamped with (mtime, size). Read
+    # from the loader threads of the GUI
+    _directories = ImageCache(maxEntries=DIRECTORY_CACHE_ENTRIES)
+    _directoriesLock = threading.Lock()
 
     @staticmethod
-    def loadmat(filename, variable_names=None):
+    def loadmat(filename, variable_names=None, lazy=False):
         '''
         this function should be called instead of direct spio.loadmat
         as it cures the problem of not properly recovering python dictionaries
         from mat files. It calls the function check keys to cure all entries
-        which are still mat-objects
+        which are still mat-objects. With lazy, structs are converted to
+        LazyStruct instead of nested dictionaries, and a MatData is returned
+        that has to be closed.
+        Named variables are read by seeking straight to them, see get_directory.
+        v7.3 files are read with h5py, see _load_hdf5
+        '''
+        if MatFileLoader.is_hdf5(filename):
+            return MatFileLoader._load_hdf5(filename, variable_names, lazy)
+        _import_scipy()
+        if variable_names is None:
+            data = spio.loadmat(filename, struct_as_record=False, squeeze_me=True)
+        else:
+            data = MatFileLoader._read_variables(filename, variable_names)
+        data = MatFileLoader._check_keys(data, lazy)
+        return MatData(data) if lazy else data
+
+    @staticmethod
+    def is_hdf5(filename):
+        ''' True for v7.3 mat files, which are HDF5 files '''
+        with open(filename, 'rb') as f:
+            header = f.read(520)
+        return header[512:520] == HDF5_SIGNATURE or header[:8] == HDF5_SIGNATURE
+
+    @staticmethod
+    def _load_hdf5(filename, variable_names=None, lazy=False):
         '''
-        data = spio.loadmat(filename, struct_as_record=False,
-                            squeeze_me=True, variable_names=variable_names)
-        return MatFileLoader._check_keys(data)
+        reads a v7.3 mat file. Without lazy everything is read into memory
+        like scipy.io.loadmat does. With lazy, structs become LazyGroup views
+        and large arrays are returned as read only memory maps, or as
+        LazyDataset views when they are chunked or compressed, both in MATLAB
+        order. They read from the open file, which the returned MatData closes
+        '''
+        if not _import_h5py():
+            raise ImportError('h5py is needed to read the MATLAB v7.3 file %s' % filename)
+
+        f = h5py.File(filename, 'r')
+        try:
+            if variable_names is None:
+                variable_names = [name for name in f if not name.startswith('#')]
+            data = {}
+            for name in variable_names:
+                if name in f:
+                    data[name] = MatFileLoader._h5_convert(f[name], lazy)
+        except BaseException:
+            f.close()
+            raise
+        if lazy:
+            return MatData(data, f)
+        f.close()
+        return data
+
+    @staticmethod
+    def _h5_fields(group):
+        ''' field names of a struct group, in MATLAB order when stored '''
+        fields = group.attrs.get('MATLAB_fields')
+        if fields is None:
+            return list(group.keys())
+        return [b''.join(field).decode() for field in fields]
+
+    @staticmethod
+    def _h5_convert(obj, lazy=False):
+        '''
+        converts a v7.3 variable to what scipy.io.loadmat with squeeze_me
+        returns: dicts for structs, transposed and squeezed arrays, strings
+        for char arrays and object arrays for cell arrays
+        '''
+        if isinstance(obj, h5py.Group):
+            if lazy:
+                return LazyGroup(obj)
+            return {key: MatFileLoader._h5_convert(obj[key])
+                    for key in MatFileLoader._h5_fields(obj)}
+
+        matlabClass = obj.attrs.get('MATLAB_class', b'')
+        if isinstance(matlabClass, bytes):
+            matlabClass = matlabClass.decode()
+
+        if obj.attrs.get('MATLAB_empty', 0):
+            return '' if matlabClass == 'char' else np.empty(0)
+
+        if h5py.check_dtype(ref=obj.dtype) is not None:
+            # cell array, every element is a reference to another variable
+            refs = obj[()]
+            cells = np.empty(refs.shape, dtype=object)
+            for idx, ref in np.ndenumerate(refs):
+                cells[idx] = MatFileLoader._h5_convert(obj.file[ref], lazy)
+            return MatFileLoader._squeeze(cells.T)
+
+        if matlabClass == 'char':
+            chars = obj[()].T
+            if chars.ndim > 1 and chars.shape[0] > 1:
+                return np.array([''.join(map(chr, row)) for row in chars])
+            return ''.join(map(chr, chars.ravel()))
+
+        if lazy and obj.size > LAZY_MIN_SIZE:
+            view = MatFileLoader._h5_memmap(obj, matlabClass)
+            return LazyDataset(obj, matlabClass) if view is None else view
+
+        data = MatFileLoader._h5_values(obj[()], matlabClass)
+        return MatFileLoader._squeeze(data.T)
+
+    @staticmethod
+    def _h5_values(data, matlabClass):
+        ''' complex and logical arrays from how v7.3 files store them '''
+        if data.dtype.names and 'real' in data.dtype.names:
+            data = data['real'] + 1j * data['imag']
+        if matlabClass == 'logical':
+            data = data.astype(bool)
+        return data
+
+    @staticmethod
+    def _h5_memmap(dataset, matlabClass=''):
+        '''
+        read only memory map of a contiguous, uncompressed numeric dataset,
+        transposed to MATLAB order and squeezed. None if it cannot be mapped
+        '''
+        if dataset.chunks is not None or dataset.dtype.kind not in 'biuf':
+            return None
+        offset = dataset.id.get_offset()
+        if offset is None:
+            return None
+        data = np.memmap(dataset.file.filename, dtype=dataset.dtype, mode='r',
+                         offset=offset, shape=dataset.shape)
+        if matlabClass == 'logical':
+            data = data.view(bool)
+        return np.squeeze(data.T)
+
+    @staticmethod
+    def _squeeze(data):
+        data = np.squeeze(data)
+        if data.shape == ():
+            return data.item()
+        return data
+
+    @staticmethod
+    def get_directory(filename):
+        '''
+        returns {name: (offset, nbytes)} for the variables of a v5 mat file,
+        or None for other mat file versions. The directory is scanned once and
+        cached until the file changes
+        '''
+        stat = os.stat(filename)
+        stamp = (stat.st_mtime, stat.st_size)
+        # None is cached too, for files that are not v5
+        with MatFileLoader._directoriesLock:
+            cached = MatFileLoader._directories.lookup(filename)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+        directory = MatFileLoader._scan_directory(filename, stat.st_size)
+        with MatFileLoader._directoriesLock:
+            MatFileLoader._directories.put(filename, directory, mtime=stamp)
+        return directory
+
+    @staticmethod
+    def _read_variables(filename, variable_names):
+        '''
+        reads only the named variables: their bytes are copied behind the
+        header into a small in-memory mat file that scipy parses
+        '''
+        directory = MatFileLoader.get_directory(filename)
+        if directory is None:
+            return spio.loadmat(filename, struct_as_record=False,
+                                squeeze_me=True, variable_names=variable_names)
+
+        with open(filename, 'rb') as f:
+            # without the subsystem offset, it points outside of the new file
+            header = bytearray(f.read(128))
+            header[116:124] = bytes(8)
+            parts = [bytes(header)]
+            for name in variable_names:
+                if name in directory:
+                    offset, nbytes = directory[name]
+                    f.seek(offset)
+                    parts.append(f.read(nbytes))
+
+        return spio.loadmat(io.BytesIO(b''.join(parts)), struct_as_record=False,
+                            squeeze_me=True)
+
+    @staticmethod
+    def _scan_directory(filename, fileSize):
+        with open(filename, 'rb') as f:
+            header = f.read(128)
+            if len(header) < 128 or header[126:128] not in (b'IM', b'MI'):
+                return None
+            endian = '<' if header[126:128] == b'IM' else '>'
+            version = struct.unpack(endian + 'H', header[124:126])[0]
+            if version != 0x0100:
+                return None
+
+            directory = {}
+            offset = 128
+            while offset + 8 <= fileSize:
+                f.seek(offset)
+                dtype, nbytes = struct.unpack(endian + 'II', f.read(8))
+                if dtype == miCOMPRESSED:
+                    body = MatFileLoader._decompress_head(f, nbytes)[8:]
+                elif dtype == miMATRIX:
+                    body = f.read(min(nbytes, NAME_BYTES))
+                    nbytes += -nbytes % 8  # padded to 8 bytes
+                else:
+                    body = None
+
+                if body:
+                    directory[MatFileLoader._matrix_name(body, endian)] = (offset, 8 + nbytes)
+                offset += 8 + nbytes
+        return directory
+
+    @staticmethod
+    def _decompress_head(f, nbytes):
+        ''' first NAME_BYTES of a compressed element, reading as little as needed '''
+        decompressor = zlib.decompressobj()
+        head = b''
+        while len(head) < NAME_BYTES and nbytes > 0 and not decompressor.eof:
+            chunk = f.read(min(4096, nbytes))
+            if not chunk:
+                break
+            nbytes -= len(chunk)
+            head += decompressor.decompress(decompressor.unconsumed_tail + chunk,
+                                            NAME_BYTES - len(head))
+        return head
+
+    @staticmethod
+    def _matrix_name(body, endian):
+        ''' name of a matrix, the third sub element after array flags and dimensions '''
+        pos = 0
+        data = b''
+        for _ in range(3):
+            dtype, nbytes = struct.unpack(endian + 'II', body[pos:pos + 8])
+            if dtype >> 16:
+                # small data element, size and type packed in the first 4 bytes
+                data = body[pos + 4:pos + 4 + (dtype >> 16)]
+                pos += 8
+            else:
+                data = body[pos + 8:pos + 8 + nbytes]
+                pos += 8 + nbytes + (-nbytes % 8)
+        return data.decode('latin1')
 
     @staticmethod
-    def _check_keys(outDict):
+    def _check_keys(outDict, lazy=False):
         '''
         checks if entries in dictionary are mat-objects. If yes
         todict is called to change them to nested dictionaries
         '''
         for key in outDict:
-            if isinstance(outDict[key], spio.matlab.mio5_params.mat_struct):
-                outDict[key] = MatFileLoader._todict(outDict[key])
+            if isinstance(outDict[key], mat_struct):
+                if lazy:
+                    outDict[key] = LazyStruct(outDict[key])
+                else:
+                    outDict[key] = MatFileLoader._todict(outDict[key])
         return outDict
 
     @staticmethod
@@ -34,7 +452,7 @@ class MatFileLoader:
         outDict = {}
         for strg in matobj._fieldnames:
             elem = matobj.__dict__[strg]
-            if isinstance(elem, spio.matlab.mio5_params.mat_struct):
+            if isinstance(elem, mat_struct):
                 outDict[strg] = MatFileLoader._todict(elem)
             else:
                 outDict[strg] = elem
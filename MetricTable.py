@@ -0,0 +1,126 @@
+'''
+Scalar result metrics of every simulation, e.g. peak displacement or wave speed
+
+Metrics are named expressions over the variables of a workspace file, like
+peak_disp = max(abs(u)) or speed = wave.c. They are configured in the METRICS
+section of the config file. Every workspace file is read once in a process
+pool for all metrics, only the variables the expressions use are loaded. The
+result is a ParameterTable with a column per metric, saved next to the batch
+and updated incrementally as long as the expressions do not change.
+'''
+import os
+import ast
+import functools
+import numpy as np
+from BatchQuery import ExpressionEvaluator, FUNCTIONS
+from MatFileLoader import MatFileLoader
+from ParameterTable import ParameterTable
+
+METRICS_FILENAME = 'solutionbrowser-metrics.npz'
+
+# reductions to turn result arrays into scalars
+METRIC_FUNCTIONS = dict(FUNCTIONS, max=(np.nanmax, 1), min=(np.nanmin, 1),
+                        mean=(np.nanmean, 1), sum=(np.nansum, 1), std=(np.nanstd, 1),
+                        median=(np.nanmedian, 1), norm=(np.linalg.norm, 1), len=(np.size, 1))
+
+
+class MetricExpression(ExpressionEvaluator):
+    functions = METRIC_FUNCTIONS
+
+    def __init__(self, expression):
+        self.expression = expression
+        self.tree = self.parse(expression)
+        self.variables = {}
+
+    def variable_names(self):
+        ''' top level workspace variables used by the expression '''
+        calls = {id(node.func) for node in ast.walk(self.tree) if isinstance(node, ast.Call)}
+        return {node.id for node in ast.walk(self.tree)
+                if isinstance(node, ast.Name) and id(node) not in calls}
+
+    def evaluate(self, variables):
+        ''' scalar value of the expression, nan if it is not a number '''
+        self.variables = variables
+        try:
+            value = np.asarray(self._eval(self.tree))
+            if value.size != 1 or value.dtype.kind not in 'biuf':
+                return np.nan
+            return float(value.item())
+        except Exception:
+            return np.nan
+        finally:
+            self.variables = {}
+
+    def _column(self, name):
+        # dotted names are fields of structs
+        value = self.variables
+        for key in name.split('.'):
+            value = value[key]
+        return value
+
+
+def extract_metrics(matFile, metrics):
+    ''' dict of metric name -> value for one workspace file, None if it cannot be read '''
+    expressions = {name: MetricExpression(expression) for name, expression in metrics.items()}
+    variableNames = set()
+    for expression in expressions.values():
+        variableNames |= expression.variable_names()
+    try:
+        variables = MatFileLoader.loadmat(matFile, variable_names=sorted(variableNames))
+    except Exception:
+        return None
+    return {name: expression.evaluate(variables) for name, expression in expressions.items()}
+
+
+class MetricTable:
+    @staticmethod
+    def get_filename(batchFolder):
+        return os.path.join(batchFolder, METRICS_FILENAME)
+
+    @staticmethod
+    def check(metrics):
+        ''' raises ValueError for an expression that cannot be parsed '''
+        for name, expression in metrics.items():
+            try:
+                MetricExpression(expression)
+            except ValueError as e:
+                raise ValueError('metric %s: %s' % (name, e))
+
+    @staticmethod
+    def load(fileName, metrics):
+        ''' returns the saved table if it has the same metrics, else None '''
+        table = ParameterTable.load(fileName)
+        if (table is None or table.names != list(metrics)
+                or table.expressions != list(metrics.values())):
+            return None
+        return table
+
+    @staticmethod
+    def extract(batchIndex, metrics, numWorkers=None, previous=None, progress=None):
+        '''
+        computes metrics, a dict of name -> expression, for all sims in
+        batchIndex. Rows of previous are reused for unchanged workspace files
+        '''
+        MetricTable.check(metrics)
+        table = ParameterTable.extract(batchIndex, numWorkers, previous, progress=progress,
+                                       reader=functools.partial(extract_metrics,
+                                                                metrics=dict(metrics)))
+        # a column for every metric in config order, also when all values are nan
+        values = np.full((len(table), len(metrics)), np.nan)
+        for col, name in enumerate(metrics):
+            if name in table.names:
+                values[:, col] = table.column(name)
+        return ParameterTable(table.simNums, list(metrics), values, table.mtimes, table.sizes,
+                              list(metrics.values()))
+
+    @staticmethod
+    def update(batchIndex, metrics, numWorkers=None, progress=None):
+        ''' extracts the metrics of a batch incrementally and saves them '''
+        fileName = MetricTable.get_filename(batchIndex.pathResolver.batchFolder)
+        table = MetricTable.extract(batchIndex, metrics, numWorkers,
+                                    MetricTable.load(fileName, metrics), progress)
+        try:
+            table.save(fileName)
+        except OSError:
+            pass
+        return table
@@ -0,0 +1,110 @@
+'''
+Loads the P struct of a simulation on a worker thread
+
+Parsed P structs are kept in an LRU cache per workspace file,
+and the files of neighbouring simulations can be prefetched, so the
+parameter dialog follows the sliders without reading mat files on the GUI
+thread. A cached P is delivered right away and a worker checks the mtime
+afterwards, a file that changed is read and delivered again.
+'''
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+from ImageCache import ImageCache
+from SolutionBrowserCore import load_parameters
+
+REQUEST_PRIORITY = 1
+PREFETCH_PRIORITY = 0
+
+
+class ParameterLoadTask(QRunnable):
+    def __init__(self, loader, matFile, cachedMtime=None):
+        super(ParameterLoadTask, self).__init__()
+        self.loader = loader
+        self.matFile = matFile
+        # mtime of the cached P that was delivered already
+        self.cachedMtime = cachedMtime
+
+    def run(self):
+        mtime = ImageCache.getmtime(self.matFile)
+        if self.cachedMtime is not None and mtime == self.cachedMtime:
+            self.loader.unchanged.emit(self.matFile)
+            return
+        P, error = load_parameters(self.matFile)
+        self.loader.loaded.emit(self.matFile, mtime, P, error)
+
+
+class ParameterLoader(QObject):
+    # P of a file from a ParameterLoadTask, cached in the GUI thread
+    loaded = pyqtSignal(str, object, object, object)
+    unchanged = pyqtSignal(str)
+
+    # P of the latest request, or None and why it could not be read
+    parametersLoaded = pyqtSignal(str, object, object)
+
+    def __init__(self, numWorkers=1, cacheEntries=256, parent=None):
+        super(ParameterLoader, self).__init__(parent)
+        self.pool = QThreadPool()
+        self.pool.setMaxThreadCount(numWorkers)
+        # P of the last cacheEntries sims
+        self.cache = ImageCache(maxEntries=cacheEntries)
+        self.requestedFile = None
+        self.tasks = {}
+        self.loaded.connect(self._onLoaded)
+        self.unchanged.connect(self._onUnchanged)
+
+    def get(self, matFile):
+        ''' P from the cache, None if not loaded yet. The mtime is not checked '''
+        entry = self.cache.lookup(matFile)
+        return None if entry is None else entry[1]
+
+    def request(self, matFile):
+        ''' load matFile in the background, parametersLoaded when done '''
+        self.requestedFile = matFile
+        entry = self.cache.lookup(matFile)
+        if entry is not None:
+            # stays requested until a worker checked that the file did not change
+            mtime, P = entry
+            self.parametersLoaded.emit(matFile, P, None)
+            if matFile not in self.tasks:
+                self._start(matFile, REQUEST_PRIORITY, mtime)
+            return
+
+        # move a queued prefetch of this file to the front
+        task = self.tasks.get(matFile)
+        if task is not None and self.pool.tryTake(task):
+            del self.tasks[matFile]
+        if matFile not in self.tasks:
+            self._start(matFile, REQUEST_PRIORITY)
+
+    def prefetch(self, matFiles):
+        ''' load matFiles in the background, replaces queued prefetches '''
+        for matFile, task in list(self.tasks.items()):
+            if matFile != self.requestedFile and self.pool.tryTake(task):
+                del self.tasks[matFile]
+        for matFile in matFiles:
+            if matFile not in self.cache and matFile not in self.tasks:
+                self._start(matFile, PREFETCH_PRIORITY)
+
+    def _start(self, matFile, priority, cachedMtime=None):
+        task = ParameterLoadTask(self, matFile, cachedMtime)
+        task.setAutoDelete(False)
+        self.tasks[matFile] = task
+        self.pool.start(task, priority)
+
+    def _onLoaded(self, matFile, mtime, P, error):
+        self.tasks.pop(matFile, None)
+        # errors are not cached, the file may be written later
+        if P is not None and mtime is not None:
+            self.cache.put(matFile, P, mtime=mtime)
+        if matFile == self.requestedFile:
+            self.requestedFile = None
+            self.parametersLoaded.emit(matFile, P, error)
+
+    def _onUnchanged(self, matFile):
+        self.tasks.pop(matFile, None)
+        if matFile == self.requestedFile:
+            self.requestedFile = None
+
+    def shutdown(self):
+        self.pool.clear()
+        self.pool.waitForDone()
+        self.tasks.clear()
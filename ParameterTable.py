@@ -0,0 +1,216 @@
+'''
+Batch wide table of the scalar fields of the P struct of every simulation
+
+The P struct is read from every workspace file in a process pool and its
+numeric scalar fields are flattened into columns, nested structs with dotted
+names (e.g. sub.a). The table is saved next to the batch and updated
+incrementally: only workspace files that are new or changed since the last
+run are read again.
+'''
+import os
+import numbers
+import zipfile
+import functools
+import numpy as np
+from MatFileLoader import MatFileLoader
+from ProcessPool import process_map
+
+TABLE_FILENAME = 'solutionbrowser-params.npz'
+
+
+def flatten_struct(P, prefix=''):
+    ''' dict of dotted field name -> float for the numeric scalar fields of P '''
+    fields = {}
+    for key, value in P.items():
+        name = prefix + key
+        if hasattr(value, 'items'):
+            fields.update(flatten_struct(value, name + '.'))
+            continue
+        if isinstance(value, np.ndarray):
+            if value.size != 1 or value.dtype.kind not in 'biuf':
+                continue
+            value = value.item()
+        if isinstance(value, numbers.Real):
+            fields[name] = float(value)
+    return fields
+
+
+def format_value(value):
+    ''' text for one field, numbers in aligned scientific notation '''
+    if isinstance(value, np.ndarray):
+        if value.size == 0:
+            return ''
+        if value.size > 1:
+            return '%s array %s' % (value.dtype, 'x'.join(str(n) for n in value.shape))
+        value = value.item()
+    if isinstance(value, bool):
+        return ' %s' % value
+    if isinstance(value, numbers.Real):
+        # space for - sign alignment
+        return '%.3e' % value if value < 0 else ' %.3e' % value
+    if value is None:
+        return ''
+    return ' %s' % value
+
+
+def list_parameters(P, prefix=''):
+    ''' list of (dotted field name, value) for all fields of P, nested structs flattened '''
+    fields = []
+    for key, value in P.items():
+        if hasattr(value, 'items'):
+            fields.extend(list_parameters(value, prefix + key + '.'))
+        else:
+            fields.append((prefix + key, value))
+    return fields
+
+
+def extract_variable(matFile, variableName='P'):
+    ''' flattened fields of one workspace file, None if it cannot be read '''
+    try:
+        mat = MatFileLoader.loadmat(matFile, variable_names=[variableName])
+        return flatten_struct(mat[variableName])
+    except Exception:
+        return None
+
+
+def file_stamp(fileName):
+    ''' (mtime, size) of fileName, (nan, -1) if it does not exist '''
+    try:
+        stat = os.stat(fileName)
+        return stat.st_mtime, stat.st_size
+    except OSError:
+        return np.nan, -1
+
+
+class ParameterTable:
+    def __init__(self, simNums, names, values, mtimes, sizes, expressions=None):
+        self.simNums = simNums
+        # field names and a (rows x fields) float matrix, nan where missing
+        self.names = list(names)
+        self.values = values
+        # stamps of the workspace files the rows were read from
+        self.mtimes = mtimes
+        self.sizes = sizes
+        # for metric tables, the expression every column was computed with
+        self.expressions = expressions
+
+    def __len__(self):
+        return len(self.simNums)
+
+    def column(self, name):
+        return self.values[:, self.names.index(name)]
+
+    def align(self, simNums):
+        ''' rows of the table in the order of simNums, nan for missing sims '''
+        tableSimNums = np.asarray(self.simNums)
+        if len(tableSimNums) == len(simNums) and (tableSimNums == simNums).all():
+            # a read-only view, the table itself must not change through its users
+            values = self.values.view()
+            values.flags.writeable = False
+            return values
+        order = np.argsort(tableSimNums)
+        pos = np.searchsorted(tableSimNums, simNums, sorter=order)
+        pos = order[np.minimum(pos, len(order) - 1)]
+        values = self.values[pos]
+        values[tableSimNums[pos] != simNums] = np.nan
+        return values
+
+    @staticmethod
+    def get_filename(batchFolder):
+        return os.path.join(batchFolder, TABLE_FILENAME)
+
+    @staticmethod
+    def load(fileName):
+        ''' returns the saved table, or None if there is none or it cannot be read '''
+        try:
+            with np.load(fileName) as data:
+                expressions = None
+                if 'expressions' in data.files:
+                    expressions = [str(e) for e in data['expressions']]
+                return ParameterTable(data['simNums'], [str(n) for n in data['names']],
+                                      data['values'], data['mtimes'], data['sizes'],
+                                      expressions)
+        except (OSError, KeyError, ValueError, EOFError, zipfile.BadZipFile):
+            return None
+
+    def save(self, fileName):
+        extra = {}
+        if self.expressions is not None:
+            extra['expressions'] = np.array(self.expressions, dtype=str)
+        # write next to it and rename, readers never see a half written table
+        tmpFile = '%s.%i.tmp' % (fileName, os.getpid())
+        try:
+            with open(tmpFile, 'wb') as f:
+                np.savez(f, simNums=self.simNums, names=np.array(self.names, dtype=str),
+                         values=self.values, mtimes=self.mtimes, sizes=self.sizes, **extra)
+            os.replace(tmpFile, fileName)
+        except OSError:
+            try:
+                os.remove(tmpFile)
+            except OSError:
+                pass
+            raise
+
+    @staticmethod
+    def extract(batchIndex, numWorkers=None, previous=None, variableName='P',
+                progress=None, reader=None):
+        '''
+        builds the table for all sims in batchIndex. Rows of previous whose
+        workspace file did not change are reused, the others are read in a
+        pool of numWorkers processes (default: number of cores). progress is
+        called with (done, total) while reading. reader maps a workspace file
+        to a dict of column values, by default the fields of variableName
+        '''
+        if reader is None:
+            reader = functools.partial(extract_variable, variableName=variableName)
+        matFiles = batchIndex.getFiles('mat').tolist()
+        simNums = np.asarray(batchIndex.simNums)
+        numSims = len(matFiles)
+        stamps = [file_stamp(f) for f in matFiles]
+        mtimes = np.array([s[0] for s in stamps], dtype=float)
+        sizes = np.array([s[1] for s in stamps], dtype=np.int64)
+
+        # reuse unchanged rows of the previous table
+        rows = [None] * numSims
+        if previous is not None:
+            previousRows = {int(num): idx for idx, num in enumerate(previous.simNums)}
+            for idx, num in enumerate(simNums.tolist()):
+                old = previousRows.get(num)
+                if (old is not None and previous.sizes[old] == sizes[idx]
+                        and previous.mtimes[old] == mtimes[idx]):
+                    values = previous.values[old]
+                    rows[idx] = {name: values[col] for col, name in enumerate(previous.names)
+                                 if not np.isnan(values[col])}
+
+        todo = [idx for idx in range(numSims) if rows[idx] is None and sizes[idx] >= 0]
+        results = process_map(reader, [matFiles[idx] for idx in todo], numWorkers)
+        for done, (idx, fields) in enumerate(zip(todo, results), 1):
+            rows[idx] = fields
+            if fields is None:
+                # not stamped, e.g. a half written file is read again next time
+                mtimes[idx], sizes[idx] = np.nan, -1
+            if progress:
+                progress(done, len(todo))
+
+        # columns in order of first appearance
+        names = {}
+        for fields in rows:
+            for name in fields or ():
+                names.setdefault(name, len(names))
+        values = np.full((numSims, len(names)), np.nan)
+        for idx, fields in enumerate(rows):
+            for name, value in (fields or {}).items():
+                values[idx, names[name]] = value
+        return ParameterTable(simNums, list(names), values, mtimes, sizes)
+
+    @staticmethod
+    def update(batchIndex, numWorkers=None, progress=None):
+        ''' extracts the table of a batch incrementally and saves it '''
+        fileName = ParameterTable.get_filename(batchIndex.pathResolver.batchFolder)
+        table = ParameterTable.extract(batchIndex, numWorkers, ParameterTable.load(fileName),
+                                       progress=progress)
+        try:
+            table.save(fileName)
+        except OSError:
+            pass
+        return table
@@ -0,0 +1,43 @@
+'''
+Formats the paths of the result files of a simulation from templates
+
+Templates are python format strings relative to the batch folder. They can
+use {name} for the simulation name and {num} for the sim number, e.g.
+{name}_{num:03d}/fig/overview_{name}_{num:03d}.png. Both / and \\ are accepted
+as separators.
+'''
+import os
+import re
+import numpy as np
+
+DEFAULT_TEMPLATES = {
+    'img': '{name}_{num:03d}/fig/overview_{name}_{num:03d}.png',
+    'mat': '{name}_{num:03d}/{name}_{num:03d}_workspace.mat',
+    'gif': '{name}_{num:03d}/fig/fiber_radius_{name}_{num:03d}.gif',
+}
+
+
+class PathResolver:
+    def __init__(self, batchFolder, simulationName, templates=None):
+        self.batchFolder = batchFolder
+        self.simulationName = simulationName
+        self.templates = dict(DEFAULT_TEMPLATES)
+        if templates:
+            self.templates.update(templates)
+
+        # absolute templates with the platform separator, only {num} left to fill
+        folder = batchFolder.replace('{', '{{').replace('}', '}}')
+        name = simulationName.replace('{', '{{').replace('}', '}}')
+        self.formats = {}
+        for kind, template in self.templates.items():
+            parts = re.split(r'[\\/]', template.replace('{name}', name))
+            self.formats[kind] = os.path.join(folder, *parts)
+
+    def resolve(self, kind, simNum):
+        ''' path of the file of type kind (img, mat, gif) for simNum '''
+        return self.formats[kind].format(num=int(simNum))
+
+    def resolve_all(self, kind, simNums):
+        ''' array with the paths of the file of type kind for all simNums '''
+        fmt = self.formats[kind].format
+        return np.array([fmt(num=num) for num in np.asarray(simNums).tolist()])
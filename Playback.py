@@ -0,0 +1,104 @@
+'''
+Decodes the frames of a playback ahead of the playhead
+
+A FramePipeline is a bounded producer/consumer queue: worker threads decode
+the next frames into a buffer while the GUI takes them one by one at the
+frame rate. At most bufferSize frames are decoded or being decoded at any
+time, so memory stays bounded however long the playback is. Frames loop
+around at the end. With a PreviewCache the previews are played, looked up by
+the workers.
+'''
+from PyQt5.QtGui import QImage
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+from ImageLoader import decode_image
+
+
+class FrameDecodeTask(QRunnable):
+    def __init__(self, pipeline, generation, position, fileName):
+        super(FrameDecodeTask, self).__init__()
+        self.pipeline = pipeline
+        self.generation = generation
+        self.position = position
+        self.fileName = fileName
+
+    def run(self):
+        # skip decoding if the playback was stopped while this one was queued
+        if self.generation != self.pipeline.generation:
+            image, fullSize = QImage(), None
+        else:
+            image, fullSize = decode_image(self.fileName, self.pipeline.previewCache)
+        self.pipeline.decoded.emit(self.generation, self.position, image, fullSize)
+
+
+class FramePipeline(QObject):
+    # frames from the FrameDecodeTasks, buffered in the GUI thread
+    decoded = pyqtSignal(int, int, QImage, object)
+
+    def __init__(self, numWorkers=2, bufferSize=8, parent=None):
+        super(FramePipeline, self).__init__(parent)
+        self.pool = QThreadPool()
+        self.pool.setMaxThreadCount(numWorkers)
+        self.bufferSize = bufferSize
+        self.generation = 0
+        self.frameFile = None
+        self.numFrames = 0
+        self.head = 0
+        self.previewCache = None
+        # position -> (decoded image, full size), and (generation, position) -> task still decoding
+        self.buffer = {}
+        self.tasks = {}
+        self.decoded.connect(self._onDecoded)
+
+    def start(self, frameFile, numFrames, position=0):
+        ''' decode ahead from position, frameFile maps a frame number to its file '''
+        self.stop()
+        self.frameFile = frameFile
+        self.numFrames = numFrames
+        self.head = position
+        self._fill()
+
+    def stop(self):
+        self.generation += 1
+        for key, task in list(self.tasks.items()):
+            if self.pool.tryTake(task):
+                del self.tasks[key]
+        self.buffer.clear()
+
+    def take(self):
+        '''
+        (frame number, image, full size) of the frame at the playhead and
+        advances it, None if that frame is not decoded yet. The image is null
+        when the file could not be decoded, the full size is None unless the
+        image is a preview
+        '''
+        entry = self.buffer.pop(self.head, None)
+        if entry is None:
+            return None
+        frame = self.head % self.numFrames
+        self.head += 1
+        self._fill()
+        return (frame,) + entry
+
+    def _fill(self):
+        # keep the next bufferSize frames decoded or decoding
+        for position in range(self.head, self.head + self.bufferSize):
+            if position in self.buffer or (self.generation, position) in self.tasks:
+                continue
+            task = FrameDecodeTask(self, self.generation, position,
+                                   self.frameFile(position % self.numFrames))
+            task.setAutoDelete(False)
+            self.tasks[(self.generation, position)] = task
+            # frames closest to the playhead first
+            self.pool.start(task, self.head + self.bufferSize - position)
+
+    def _onDecoded(self, generation, position, image, fullSize):
+        self.tasks.pop((generation, position), None)
+        if generation != self.generation or position < self.head:
+            return  # stale result
+        self.buffer[position] = (image, fullSize)
+
+    def shutdown(self):
+        self.stop()
+        self.pool.clear()
+        self.pool.waitForDone()
+        self.tasks.clear()
@@ -0,0 +1,214 @@
+'''
+Persistent cache of downscaled previews of the result images of a batch
+
+Previews are written at a few fixed sizes (longest side in pixels) into a
+cache folder, by default next to the batch. The name of a preview is a hash
+of the path, mtime and size of the image it was made from, so a changed image
+gets new previews. Looking a preview up touches it, when the cache is over
+its size limit the least recently used previews are removed, e.g. the old
+ones of changed images. Previews are generated in a process pool until the
+cache is full, the viewers only look them up.
+'''
+import os
+import time
+import hashlib
+from PyQt5.QtGui import QImage
+from PyQt5.QtCore import Qt
+from ProcessPool import process_map
+
+PREVIEW_FOLDER = 'solutionbrowser-previews'
+PREVIEW_SIZES = (256, 1600)
+PREVIEW_QUALITY = 90
+# only generate with at least this part of the budget free, a full cache
+# then stays as it is instead of swapping previews on every run
+MIN_FREE_FRACTION = 0.05
+
+
+def preview_name(fileName, stat, size, fmt):
+    key = '%s|%i|%i' % (os.path.abspath(fileName), stat.st_mtime_ns, stat.st_size)
+    return '%s_%i.%s' % (hashlib.sha1(key.encode()).hexdigest(), size, fmt)
+
+
+def make_previews(fileName, folder, sizes, fmt):
+    ''' writes the missing previews of fileName, returns the number of bytes written '''
+    try:
+        stat = os.stat(fileName)
+    except OSError:
+        return 0
+    paths = [(size, os.path.join(folder, preview_name(fileName, stat, size, fmt)))
+             for size in sizes]
+    paths = [(size, path) for size, path in paths if not os.path.exists(path)]
+    if not paths:
+        return 0
+    image = QImage(fileName)
+    if image.isNull():
+        return 0
+
+    nbytes = 0
+    for size, path in paths:
+        preview = image
+        if max(image.width(), image.height()) > size:
+            preview = image.scaled(size, size, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+        # write next to it and rename, viewers never see half written files
+        tmpPath = '%s.%i.tmp' % (path, os.getpid())
+        if preview.save(tmpPath, fmt, PREVIEW_QUALITY):
+            os.replace(tmpPath, path)
+            nbytes += os.path.getsize(path)
+    return nbytes
+
+
+class PreviewCache:
+    def __init__(self, folder, sizes=PREVIEW_SIZES, maxBytes=1024 * 2**20, fmt='jpg'):
+        self.folder = folder
+        self.sizes = sorted(sizes)
+        self.maxBytes = maxBytes
+        self.fmt = fmt
+        # previews marked as used in this session, see lookup
+        self.touched = set()
+
+    @staticmethod
+    def get_folder(batchFolder, cacheFolder=None):
+        ''' preview folder of a batch, inside cacheFolder if given '''
+        if cacheFolder:
+            return os.path.join(cacheFolder, os.path.basename(os.path.normpath(batchFolder)))
+        return os.path.join(batchFolder, PREVIEW_FOLDER)
+
+    def lookup(self, fileName, size=None):
+        '''
+        path of the smallest preview of fileName with a longest side of at
+        least size, or the largest preview if none is that big. None if
+        there is no preview (yet)
+        '''
+        try:
+            stat = os.stat(fileName)
+        except OSError:
+            return None
+        sizes = self.sizes
+        if size is not None:
+            sizes = [s for s in sizes if s >= size] + [s for s in reversed(sizes) if s < size]
+        else:
+            sizes = list(reversed(sizes))
+        for s in sizes:
+            path = os.path.join(self.folder, preview_name(fileName, stat, s, self.fmt))
+            if path in self.touched:
+                return path
+            try:
+                # used now, the mtime orders the cleanup. Once per session, it
+                # is a write to the share on every step otherwise
+                os.utime(path)
+                self.touched.add(path)
+                return path
+            except FileNotFoundError:
+                continue
+            except OSError:
+                # read only cache folder
+                if os.path.exists(path):
+                    return path
+        return None
+
+    def missing(self, fileName, names):
+        ''' True if fileName exists and some of its previews are not in names '''
+        try:
+            stat = os.stat(fileName)
+        except OSError:
+            return False
+        return not all(preview_name(fileName, stat, s, self.fmt) in names for s in self.sizes)
+
+    def _previews(self):
+        ''' name -> size in bytes of the previews in the cache '''
+        try:
+            return {e.name: e.stat().st_size for e in os.scandir(self.folder)
+                    if e.is_file() and not e.name.endswith('.tmp')}
+        except OSError:
+            return {}
+
+    def generate(self, fileNames, numWorkers=None, progress=None):
+        '''
+        writes the missing previews of fileNames in a pool of numWorkers
+        processes (default: number of cores), until the cache is full.
+        progress is called with (done, total). Returns the number of bytes
+        written
+        '''
+        os.makedirs(self.folder, exist_ok=True)
+        # back within the size limit first, dropping the least recently used
+        self.cleanup()
+        previews = self._previews()
+        room = self.maxBytes - sum(previews.values())
+        if room < MIN_FREE_FRACTION * self.maxBytes:
+            return 0
+
+        # one listing of the cache instead of looking up every preview
+        fileNames = [f for f in fileNames if self.missing(f, previews)]
+        nbytes = 0
+        results = process_map(make_previews, fileNames, numWorkers,
+                              self.folder, self.sizes, self.fmt)
+        for done, written in enumerate(results, 1):
+            nbytes += written
+            # full, more would push out previews that are in use
+            full = nbytes >= room
+            if progress:
+                progress(len(fileNames) if full else done, len(fileNames))
+            if full:
+                results.close()
+                break
+        if not nbytes:
+            return 0
+
+        # the chunks that were already running when it got full wrote more,
+        # drop what does not fit from the new previews, not the ones in use
+        new = {name: size for name, size in self._previews().items() if name not in previews}
+        over = sum(new.values()) - room
+        for name in sorted(new):
+            if over <= 0:
+                break
+            if self._remove(os.path.join(self.folder, name)):
+                over -= new.pop(name)
+        return sum(new.values())
+
+    def cleanup(self, maxBytes=None):
+        '''
+        removes the least recently used previews until the cache fits in
+        maxBytes (default: the size limit), and left over temporary files.
+        Returns the number of files removed
+        '''
+        maxBytes = self.maxBytes if maxBytes is None else maxBytes
+        try:
+            entries = [e for e in os.scandir(self.folder) if e.is_file()]
+        except OSError:
+            return 0
+
+        removed = 0
+        previews = []
+        for entry in entries:
+            stat = entry.stat()
+            if entry.name.endswith('.tmp'):
+                # from a crashed or running generator, only remove old ones
+                if stat.st_mtime < time.time() - 3600:
+                    removed += self._remove(entry.path)
+                continue
+            previews.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total = sum(p[1] for p in previews)
+        for _, nbytes, path in sorted(previews):
+            if total <= maxBytes:
+                break
+            total -= nbytes
+            removed += self._remove(path)
+        return removed
+
+    def _remove(self, path):
+        self.touched.discard(path)
+        try:
+            os.remove(path)
+            return 1
+        except OSError:
+            return 0
+
+    def stats(self):
+        ''' number of previews and their size in MB '''
+        try:
+            sizes = [e.stat().st_size for e in os.scandir(self.folder) if e.is_file()]
+        except OSError:
+            sizes = []
+        return {'entries': len(sizes), 'MB': sum(sizes) / 2**20,
+                'budget MB': self.maxBytes / 2**20}
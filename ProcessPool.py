@@ -0,0 +1,30 @@
+'''
+Runs a function over many files in a pool of processes
+
+Used by the batch wide extractors (P table, metrics, previews), which read or
+decode one file per call. Processes are spawned: forking a process with
+running (Qt) threads is not safe.
+'''
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+
+def process_map(function, items, numWorkers=None, *args):
+    '''
+    yields function(item, *args) for every item, in order, computed in a pool
+    of numWorkers processes (default: number of cores). Items are sent in
+    chunks, a few per worker. Closing the generator early cancels the chunks
+    that did not start yet
+    '''
+    items = list(items)
+    if not items:
+        return
+    chunksize = max(1, len(items) // (4 * (numWorkers or os.cpu_count() or 1)))
+    context = multiprocessing.get_context('spawn')
+    executor = ProcessPoolExecutor(numWorkers, mp_context=context)
+    try:
+        yield from executor.map(function, items, *[[arg] * len(items) for arg in args],
+                                chunksize=chunksize)
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,126 @@
+'''
+Command line for the batch work that does not need the GUI
+
+Meant to run on the compute nodes right after a sweep finished, so the GUI
+opens onto a warm cache:
+
+    python SolutionBrowserCli.py index batch1 --scan
+    python SolutionBrowserCli.py thumbs batch1
+    python SolutionBrowserCli.py extract batch1
+    python SolutionBrowserCli.py query batch1 "E > 1000 and M.peak_disp < 0.1"
+
+Batches are relative to base_folder of the config file (absolute paths work
+too), without one the default_set is used. Settings are read from the same
+config file as the GUI, see SolutionBrowserCore.
+'''
+import os
+import sys
+import argparse
+from SolutionBrowserCore import Batch, BatchSettings, read_config
+
+
+def print_progress(label):
+    def progress(done, total):
+        sys.stderr.write('\r%s %i/%i' % (label, done, total))
+        if done == total:
+            sys.stderr.write('\n')
+        sys.stderr.flush()
+    return progress
+
+
+def index(batch, args):
+    print('%s: %i sims, %i parameters' % (batch.folder, batch.index.numSims,
+                                           len(batch.index.parNames)))
+    if args.scan:
+        for kind, exists in batch.index.scan_files().items():
+            print('%s files: %i of %i' % (kind, exists.sum(), len(exists)))
+    return 0
+
+
+def thumbs(batch, args):
+    previewCache = batch.get_preview_cache()
+    if previewCache is None:
+        sys.stderr.write('previews are disabled in the config file, or PyQt5 is not installed\n')
+        return 1
+    numWorkers = args.workers or batch.settings.preview_workers or None
+    nbytes = batch.generate_previews(numWorkers, print_progress('previews'))
+    print('wrote %.1f MB of previews to %s' % (nbytes / 2**20, previewCache.folder))
+    return 0
+
+
+def extract(batch, args):
+    numWorkers = args.workers or batch.settings.extract_workers or None
+    if args.what in ('all', 'parameters'):
+        table = batch.extract_parameters(numWorkers, print_progress('parameters'))
+        print('%i parameters of %i sims' % (len(table.names), len(table)))
+    if args.what in ('all', 'metrics'):
+        if not batch.settings.metrics:
+            print('no metrics configured, add them to the METRICS section of the config file')
+        else:
+            table = batch.extract_metrics(numWorkers, print_progress('metrics'))
+            print('%i metrics of %i sims' % (len(table.names), len(table)))
+    return 0
+
+
+def query(batch, args):
+    try:
+        rows = batch.query(args.expression)
+    except ValueError as e:
+        sys.stderr.write('%s\n' % e)
+        return 2
+    if args.count:
+        print(len(rows))
+        return 0
+    if args.limit:
+        rows = rows[:args.limit]
+    batchIndex = batch.index
+    columns = [batchIndex.getValues(idx, rows) for idx in range(len(batchIndex.parNames))]
+    print('\t'.join(['SimNum'] + list(batchIndex.parNames)))
+    for i, row_idx in enumerate(rows):
+        print('\t'.join([str(batchIndex.simNums[row_idx])] + [str(column[i]) for column in columns]))
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='SolutionBrowser batch tools')
+    parser.add_argument('--config', help='config file, default: the one of the GUI')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    def add_command(name, run, help):
+        command = commands.add_parser(name, help=help)
+        command.add_argument('batch', nargs='?', help='batch folder, default: default_set')
+        command.set_defaults(run=run)
+        return command
+
+    command = add_command('index', index, 'build the batch index')
+    command.add_argument('--scan', action='store_true', help='count the existing result files')
+
+    command = add_command('thumbs', thumbs, 'generate the missing previews')
+    command.add_argument('--workers', type=int, default=0, help='processes, default from config')
+
+    command = add_command('extract', extract, 'build the P and metric tables')
+    command.add_argument('--what', choices=('all', 'parameters', 'metrics'), default='all')
+    command.add_argument('--workers', type=int, default=0, help='processes, default from config')
+
+    command = add_command('query', query, 'print the sims that match a filter')
+    command.add_argument('expression', help='filter, e.g. "E > 1000 and P.rho < 2"')
+    command.add_argument('--count', action='store_true', help='only print the number of matches')
+    command.add_argument('--limit', type=int, default=0, help='print at most this many')
+
+    args = parser.parse_args(argv)
+    if args.config and not os.path.isfile(args.config):
+        parser.error('config file %s does not exist' % args.config)
+    settings = BatchSettings(read_config(args.config))
+    batchFolder = args.batch or settings.default_set
+    if not batchFolder:
+        parser.error('no batch given and no default_set in the config file')
+    try:
+        batch = Batch(Batch.get_folder(settings, batchFolder), settings)
+    except (OSError, ValueError) as e:
+        sys.stderr.write('could not open %s: %s\n' % (batchFolder, e))
+        return 1
+    return args.run(batch, args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,203 @@
+'''
+The batch without the GUI, shared by mySolutionBrowser.py and the command line
+
+Reads the settings from the config file, opens a batch with its index,
+parameter and metric tables and preview cache, and loads the parameters of a
+simulation. Nothing here needs Qt, except the previews, which are drawn with
+QImage (no display or QApplication needed). PyQt5 is only imported when the
+preview cache is first used, without it there are no previews, indexing,
+extracting and querying still work.
+'''
+import os
+import configparser
+import numpy as np
+from BatchIndex import BatchIndex
+from BatchQuery import BatchQuery
+from MatFileLoader import MatFileLoader
+from MetricTable import MetricTable
+from ParameterTable import ParameterTable
+from PathResolver import DEFAULT_TEMPLATES
+
+# imported on first use, see _import_preview_cache
+PreviewCache = None
+
+CONFIG_FILENAME = 'mySolutionBrowserConfig.ini'
+NOT_FOUND_TEXT = 'mat file not found... :('
+
+
+def create_config_file(configFilePath):
+    # create config parser:
+    config = configparser.ConfigParser(allow_no_value=True)
+    # window settings
+    config.add_section('WINDOW')
+    config.set('WINDOW', 'hsize', '3600')
+    config.set('WINDOW', 'vsize', '1600')
+    config.set('WINDOW', 'start_maximized', 'yes')
+    # data settings
+    config.add_section('DATA')
+    config.set('DATA', 'base_folder',
+               'C:\\Users\\rickw\\OneDrive\\Studie\\BMD_Master\\Internship_ImPhys\\EMech_waves\\mechanical_model\\model\\data')
+    config.set('DATA', 'parlist_filename', 'parlist_sim.csv')
+    config.set('DATA', 'default_set')
+    # folder for the previews of all batches, empty to keep them inside each batch
+    config.set('DATA', 'preview_folder', '')
+    # result file locations relative to the batch folder, see PathResolver
+    for kind, template in DEFAULT_TEMPLATES.items():
+        config.set('DATA', '%s_template' % kind, template)
+    # AHK settings
+    config.add_section('AHK')
+    config.set('AHK', 'executable_path')
+    # image loading
+    config.add_section('LOADING')
+    config.set('LOADING', 'prefetch_depth', '1')
+    config.set('LOADING', 'decode_workers', '2')
+    config.set('LOADING', 'image_cache_mb', '1024')
+    config.set('LOADING', 'pixmap_cache_mb', '256')
+    # thumbnails of the sweep grid, 0 workers for one per core
+    config.set('LOADING', 'thumbnail_workers', '0')
+    config.set('LOADING', 'thumbnail_cache_mb', '128')
+    # downscaled previews on disk: no, yes (File menu) or background (on opening)
+    config.set('LOADING', 'previews', 'yes')
+    config.set('LOADING', 'preview_sizes', '256, 1600')
+    config.set('LOADING', 'preview_format', 'jpg')
+    config.set('LOADING', 'preview_cache_mb', '2048')
+    config.set('LOADING', 'preview_workers', '0')
+    # playback frame rate, and frames decoded ahead by how many threads
+    config.set('LOADING', 'play_fps', '10')
+    config.set('LOADING', 'play_buffer', '16')
+    config.set('LOADING', 'play_workers', '2')
+    # gifs are streamed with this many frames decoded ahead, or cached whole
+    config.set('LOADING', 'gif_streaming', 'yes')
+    config.set('LOADING', 'gif_buffer', '8')
+    # check which result files exist when opening a batch: no, yes or background
+    config.set('LOADING', 'scan_files', 'background')
+    # processes used to extract P from all workspace files, 0 for all cores
+    config.set('LOADING', 'extract_workers', '0')
+    # scalar metrics computed from the workspace variables, see MetricTable
+    config.add_section('METRICS')
+    config.set('METRICS', '# name = expression, e.g. peak_disp = max(abs(u))')
+
+    # Writing our configuration file to
+    with open(configFilePath, 'w') as configfile:
+        config.write(configfile)
+
+
+def read_config(configFilePath=None):
+    '''
+    parses the config file, by default the one next to this file. A config
+    file with the default settings is created if it does not exist
+    '''
+    if configFilePath is None:
+        configFilePath = os.path.join(os.path.dirname(os.path.realpath(__file__)), CONFIG_FILENAME)
+    # check if exists
+    if not os.path.isfile(configFilePath):
+        create_config_file(configFilePath)
+    config = configparser.ConfigParser(allow_no_value=True)
+    # keep the case of the keys, metric names are shown as written
+    config.optionxform = str
+    config.read(configFilePath)
+    return config
+
+
+def _import_preview_cache():
+    # optional, the previews are drawn with QImage
+    global PreviewCache
+    if PreviewCache is None:
+        try:
+            from PreviewCache import PreviewCache
+        except ImportError:
+            return False
+    return True
+
+
+def load_parameters(matFile):
+    ''' (P, error) of a workspace file, P is None and error the reason if it cannot be read '''
+    try:
+        return MatFileLoader.loadmat(matFile, variable_names=['P'])['P'], None
+    except FileNotFoundError:
+        return None, NOT_FOUND_TEXT
+    except Exception as e:
+        return None, 'could not read P from %s: %s' % (matFile, e)
+
+
+class BatchSettings:
+    ''' the DATA, LOADING and METRICS settings batches are opened with '''
+
+    def __init__(self, config):
+        # data section
+        self.base_folder = config.get('DATA', 'base_folder')
+        self.parlist_filename = config.get('DATA', 'parlist_filename')
+        self.default_set = config.get('DATA', 'default_set')
+        self.preview_folder = config.get('DATA', 'preview_folder', fallback='')
+        self.path_templates = {}
+        for kind, template in DEFAULT_TEMPLATES.items():
+            self.path_templates[kind] = config.get('DATA', '%s_template' % kind, fallback=template)
+
+        # loading section, fall back to defaults for older config files
+        self.previews = config.get('LOADING', 'previews', fallback='yes')
+        self.preview_sizes = [int(size) for size in
+                              config.get('LOADING', 'preview_sizes', fallback='256, 1600').split(',')]
+        self.preview_format = config.get('LOADING', 'preview_format', fallback='jpg')
+        self.preview_cache_mb = config.getint('LOADING', 'preview_cache_mb', fallback=2048)
+        self.preview_workers = config.getint('LOADING', 'preview_workers', fallback=0)
+        self.scan_files = config.get('LOADING', 'scan_files', fallback='background')
+        self.extract_workers = config.getint('LOADING', 'extract_workers', fallback=0)
+
+        # metrics section, name -> expression. Raw, % is the modulo operator here
+        self.metrics = {}
+        if config.has_section('METRICS'):
+            self.metrics = dict(config.items('METRICS', raw=True))
+
+
+class Batch:
+    '''
+    an opened batch: the index, the parameter and metric tables if they were
+    extracted before, and the preview cache, see get_preview_cache
+    '''
+
+    def __init__(self, batchFolder, settings):
+        self.folder = batchFolder
+        self.settings = settings
+        # load the batch index, parses the parameter list if needed
+        self.index = BatchIndex.open_batch(batchFolder, settings.parlist_filename,
+                                           settings.path_templates)
+        self.parameterTable = ParameterTable.load(ParameterTable.get_filename(batchFolder))
+        self.metricTable = MetricTable.load(MetricTable.get_filename(batchFolder), settings.metrics)
+
+        # made on first use, it imports PyQt5
+        self.previewCache = None
+
+    @staticmethod
+    def get_folder(settings, batchFolder):
+        ''' batchFolder relative to the base folder, absolute paths are kept '''
+        return os.path.join(settings.base_folder, batchFolder)
+
+    def get_preview_cache(self):
+        ''' the preview cache, None if previews are disabled or PyQt5 is not installed '''
+        settings = self.settings
+        if self.previewCache is None and settings.previews != 'no' and _import_preview_cache():
+            self.previewCache = PreviewCache(
+                PreviewCache.get_folder(self.folder, settings.preview_folder),
+                settings.preview_sizes, settings.preview_cache_mb * 2**20, settings.preview_format)
+        return self.previewCache
+
+    def query(self, expression):
+        ''' rows of the sims that match a filter expression, see BatchQuery '''
+        query = BatchQuery(self.index, {'P': self.parameterTable, 'M': self.metricTable})
+        return np.flatnonzero(query.evaluate(expression))
+
+    def extract_parameters(self, numWorkers=None, progress=None):
+        ''' reads P of the new and changed sims, returns the updated table '''
+        self.parameterTable = ParameterTable.update(self.index, numWorkers, progress)
+        return self.parameterTable
+
+    def extract_metrics(self, numWorkers=None, progress=None):
+        ''' computes the configured metrics of the new and changed sims '''
+        self.metricTable = MetricTable.update(self.index, self.settings.metrics, numWorkers,
+                                              progress)
+        return self.metricTable
+
+    def generate_previews(self, numWorkers=None, progress=None):
+        ''' writes the missing previews of all images, returns the number of bytes written '''
+        return self.get_preview_cache().generate(self.index.getFiles('img').tolist(),
+                                                 numWorkers, progress)
@@ -0,0 +1,218 @@
+'''
+Small multiples of a parameter sweep
+
+Shows a thumbnail for every value of one parameter, or a grid over two
+parameters, with the other parameters fixed at the values of the sliders.
+Thumbnails come from a ThumbnailLoader and are painted as they arrive.
+Clicking a tile emits the sim number of that tile.
+'''
+from PyQt5.QtWidgets import QWidget, QComboBox, QLabel, QHBoxLayout, QVBoxLayout, QSizePolicy
+from PyQt5.QtGui import QPainter, QColor, QPen
+from PyQt5.QtCore import Qt, QRect, pyqtSignal
+import numpy as np
+
+LABEL_HEIGHT = 16
+TILE_MARGIN = 4
+# thumbnails are requested in steps of this many pixels, so small resizes reuse them
+SIZE_STEP = 32
+
+
+class SweepCanvas(QWidget):
+    tileClicked = pyqtSignal(int)
+    resized = pyqtSignal()
+
+    def __init__(self, parent=None):
+        super(SweepCanvas, self).__init__(parent)
+        self.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
+        # row index per tile (-1 where not simulated), shape (rows, columns)
+        self.rows = np.full((0, 0), -1)
+        self.labels = {}
+        self.files = {}
+        self.images = {}
+        self.failed = set()
+        self.hits = None
+        self.currentRow = -1
+
+    def cellSize(self):
+        numRows, numCols = self.rows.shape
+        return self.width() // max(numCols, 1), self.height() // max(numRows, 1)
+
+    def thumbnailSize(self):
+        ''' size of the image area of a tile, rounded down to SIZE_STEP '''
+        cellWidth, cellHeight = self.cellSize()
+        width = cellWidth - 2 * TILE_MARGIN
+        height = cellHeight - 2 * TILE_MARGIN - LABEL_HEIGHT
+        return (max(SIZE_STEP, width - width % SIZE_STEP),
+                max(SIZE_STEP, height - height % SIZE_STEP))
+
+    def tileRect(self, i, j):
+        cellWidth, cellHeight = self.cellSize()
+        return QRect(j * cellWidth, i * cellHeight, cellWidth, cellHeight)
+
+    def tileUpdated(self, fileName):
+        for (i, j), tileFile in self.files.items():
+            if tileFile == fileName:
+                self.update(self.tileRect(i, j))
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.fillRect(event.rect(), self.palette().dark())
+        numRows, numCols = self.rows.shape
+        for i in range(numRows):
+            for j in range(numCols):
+                rect = self.tileRect(i, j)
+                if rect.intersects(event.rect()):
+                    self.paintTile(painter, i, j, rect)
+
+    def paintTile(self, painter, i, j, rect):
+        row_idx = self.rows[i, j]
+        inner = rect.adjusted(TILE_MARGIN, TILE_MARGIN, -TILE_MARGIN, -TILE_MARGIN)
+        imageRect = inner.adjusted(0, 0, 0, -LABEL_HEIGHT)
+        labelRect = QRect(inner.left(), imageRect.bottom(), inner.width(), LABEL_HEIGHT)
+
+        painter.setPen(self.palette().brightText().color())
+        painter.drawText(labelRect, Qt.AlignCenter, self.labels.get((i, j), ''))
+
+        fileName = self.files.get((i, j))
+        image = self.images.get(fileName)
+        if row_idx < 0:
+            painter.drawText(imageRect, Qt.AlignCenter, 'not simulated')
+        elif image is not None:
+            # center the thumbnail, also when it was made for another tile size
+            size = image.size().scaled(imageRect.size(), Qt.KeepAspectRatio)
+            target = QRect(0, 0, size.width(), size.height())
+            target.moveCenter(imageRect.center())
+            painter.drawImage(target, image)
+        else:
+            text = 'no image' if fileName is None or fileName in self.failed else 'loading...'
+            painter.drawText(imageRect, Qt.AlignCenter, text)
+
+        if row_idx >= 0 and self.hits is not None and not self.hits[row_idx]:
+            # dim sims that do not match the filter
+            painter.fillRect(rect, QColor(0, 0, 0, 160))
+        if row_idx >= 0 and row_idx == self.currentRow:
+            painter.setPen(QPen(QColor('orange'), 3))
+            painter.drawRect(rect.adjusted(1, 1, -2, -2))
+
+    def resizeEvent(self, event):
+        super(SweepCanvas, self).resizeEvent(event)
+        self.resized.emit()
+
+    def mousePressEvent(self, event):
+        cellWidth, cellHeight = self.cellSize()
+        i = event.pos().y() // max(cellHeight, 1)
+        j = event.pos().x() // max(cellWidth, 1)
+        if i < self.rows.shape[0] and j < self.rows.shape[1] and self.rows[i, j] >= 0:
+            self.tileClicked.emit(int(self.rows[i, j]) + 1)
+
+
+class SweepView(QWidget):
+    # sim number of a clicked tile
+    simSelected = pyqtSignal(int)
+
+    def __init__(self, thumbnailLoader, parent=None):
+        super(SweepView, self).__init__(parent)
+        self.loader = thumbnailLoader
+        self.loader.thumbnailLoaded.connect(self.thumbnailLoaded)
+        self.loader.thumbnailFailed.connect(self.thumbnailFailed)
+        self.batchIndex = None
+        self.valIndices = None
+        self.requestedSize = None
+
+        # parameters along the columns and rows of the grid
+        self.colBox = QComboBox(self)
+        self.rowBox = QComboBox(self)
+        self.colBox.currentIndexChanged.connect(self.refresh)
+        self.rowBox.currentIndexChanged.connect(self.refresh)
+        self.canvas = SweepCanvas(self)
+        self.canvas.tileClicked.connect(self.simSelected)
+        self.canvas.resized.connect(self.requestThumbnails)
+
+        header = QHBoxLayout()
+        header.addWidget(QLabel('Columns', self))
+        header.addWidget(self.colBox)
+        header.addWidget(QLabel('Rows', self))
+        header.addWidget(self.rowBox)
+        header.addStretch()
+        layout = QVBoxLayout(self)
+        layout.addLayout(header)
+        layout.addWidget(self.canvas)
+        layout.setContentsMargins(1, 1, 1, 1)
+
+    def setBatch(self, batchIndex):
+        self.batchIndex = batchIndex
+        for box, names in ((self.colBox, batchIndex.parNames),
+                           (self.rowBox, ['-'] + list(batchIndex.parNames))):
+            box.blockSignals(True)
+            box.clear()
+            box.addItems(names)
+            box.blockSignals(False)
+
+    def showSweep(self, valIndices, currentRow, hits=None):
+        ''' sweep around valIndices, the slider positions '''
+        self.valIndices = list(valIndices)
+        self.canvas.currentRow = currentRow
+        self.canvas.hits = hits
+        self.refresh()
+
+    def refresh(self):
+        if self.batchIndex is None or self.valIndices is None or not self.isVisible():
+            return
+        batchIndex = self.batchIndex
+        colPar = self.colBox.currentIndex()
+        rowPar = self.rowBox.currentIndex() - 1
+        if rowPar == colPar:
+            rowPar = -1
+        numCols = len(batchIndex.uniqueVals[colPar])
+        numRows = len(batchIndex.uniqueVals[rowPar]) if rowPar >= 0 else 1
+
+        # value indices of all tiles, the other parameters fixed
+        valIndices = np.tile(np.asarray(self.valIndices), (numRows, numCols, 1))
+        valIndices[:, :, colPar] = np.arange(numCols)[None, :]
+        if rowPar >= 0:
+            valIndices[:, :, rowPar] = np.arange(numRows)[:, None]
+        rows = batchIndex.getRowIndex(valIndices.reshape(-1, len(self.valIndices)))
+        rows = np.asarray(rows).reshape(numRows, numCols)
+
+        canvas = self.canvas
+        canvas.rows = rows
+        canvas.labels = {}
+        canvas.files = {}
+        canvas.failed = set()
+        colName = batchIndex.parNames[colPar]
+        for (i, j), row_idx in np.ndenumerate(rows):
+            label = '%s = %s' % (colName, batchIndex.uniqueVals[colPar][j])
+            if rowPar >= 0:
+                label += ', %s = %s' % (batchIndex.parNames[rowPar],
+                                        batchIndex.uniqueVals[rowPar][i])
+            if row_idx >= 0:
+                label += ' (%03i)' % (row_idx + 1)
+                if batchIndex.hasFile('img', row_idx) is not False:
+                    canvas.files[(i, j)] = batchIndex.getFile('img', row_idx)
+            canvas.labels[(i, j)] = label
+        # keep thumbnails of files that are still shown, e.g. when moving a slider
+        shown = set(canvas.files.values())
+        canvas.images = {f: image for f, image in canvas.images.items() if f in shown}
+        canvas.update()
+        self.requestThumbnails(force=True)
+
+    def requestThumbnails(self, force=False):
+        size = self.canvas.thumbnailSize()
+        if not force and size == self.requestedSize:
+            return
+        self.requestedSize = size
+        # in tile order, row by row
+        files = list(dict.fromkeys(self.canvas.files.values()))
+        self.loader.request(files, *size)
+
+    def thumbnailLoaded(self, fileName, image):
+        self.canvas.images[fileName] = image
+        self.canvas.tileUpdated(fileName)
+
+    def thumbnailFailed(self, fileName):
+        self.canvas.failed.add(fileName)
+        self.canvas.tileUpdated(fileName)
+
+    def showEvent(self, event):
+        super(SweepView, self).showEvent(event)
+        self.refresh()
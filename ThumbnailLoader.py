@@ -0,0 +1,128 @@
+'''
+Decodes downscaled thumbnails of many images at once on a worker thread pool
+
+Images are decoded straight to the thumbnail size with QImageReader, which
+formats like jpeg do while decoding. Thumbnails are delivered one by one as
+they finish, so a view can paint them progressively. A new request cancels
+the thumbnails of the previous one that are still queued. Thumbnails are kept
+in an ImageCache keyed by path and size, cached thumbnails are delivered right
+away and checked for changes on the workers. With a PreviewCache, thumbnails
+are made from the smallest preview that is large enough instead of the image.
+'''
+from PyQt5.QtGui import QImage, QImageReader
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, Qt, pyqtSignal
+from ImageCache import ImageCache
+
+
+class ThumbnailTask(QRunnable):
+    def __init__(self, loader, requestId, fileName, width, height, cachedMtime=None):
+        super(ThumbnailTask, self).__init__()
+        self.loader = loader
+        self.requestId = requestId
+        self.fileName = fileName
+        self.width = width
+        self.height = height
+        # mtime of the cached thumbnail that was delivered already
+        self.cachedMtime = cachedMtime
+
+    def run(self):
+        # skip decoding if a newer request came in while this one was queued
+        mtime = None
+        if self.requestId != self.loader.latestId:
+            image = QImage()
+        else:
+            mtime = ImageCache.getmtime(self.fileName)
+            if self.cachedMtime is not None and mtime == self.cachedMtime:
+                self.loader.unchanged.emit(self.requestId, self.fileName)
+                return
+            source = None
+            if self.loader.previewCache is not None:
+                source = self.loader.previewCache.lookup(self.fileName,
+                                                         max(self.width, self.height))
+            image = ThumbnailLoader.decode(source or self.fileName, self.width, self.height)
+            if image.isNull() and source:
+                # removed by another session after the lookup
+                image = ThumbnailLoader.decode(self.fileName, self.width, self.height)
+        self.loader.decoded.emit(self.requestId, self.fileName, mtime, image)
+
+
+class ThumbnailLoader(QObject):
+    # one per thumbnail from the ThumbnailTasks, handled in the GUI thread
+    decoded = pyqtSignal(int, str, object, QImage)
+    unchanged = pyqtSignal(int, str)
+
+    # public signals, only for the latest request
+    thumbnailLoaded = pyqtSignal(str, QImage)
+    thumbnailFailed = pyqtSignal(str)
+
+    def __init__(self, numWorkers=None, cacheBytes=128 * 2**20, parent=None):
+        super(ThumbnailLoader, self).__init__(parent)
+        self.pool = QThreadPool()
+        if numWorkers:
+            self.pool.setMaxThreadCount(numWorkers)
+        self.latestId = 0
+        self.size = (0, 0)
+        # keep the tasks alive until they reported back
+        self.tasks = {}
+        self.cache = ImageCache(cacheBytes)
+        self.previewCache = None
+        self.decoded.connect(self._onDecoded)
+        self.unchanged.connect(self._onUnchanged)
+
+    @staticmethod
+    def decode(fileName, width, height):
+        ''' image in fileName scaled to fit in width x height '''
+        reader = QImageReader(fileName)
+        size = reader.size()
+        if size.isValid():
+            reader.setScaledSize(size.scaled(width, height, Qt.KeepAspectRatio))
+        image = reader.read()
+        if not image.isNull() and (image.width() > width or image.height() > height):
+            image = image.scaled(width, height, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+        return image
+
+    def request(self, fileNames, width, height):
+        '''
+        thumbnails of fileNames that fit in width x height, in order. Cached
+        thumbnails are delivered right away, the others as they are decoded.
+        Cached thumbnails of files that changed are delivered again
+        '''
+        self.cancel()
+        self.size = (width, height)
+        for fileName in fileNames:
+            mtime = None
+            entry = self.cache.lookup((fileName, width, height))
+            if entry is not None:
+                mtime, image = entry
+                self.thumbnailLoaded.emit(fileName, image)
+            task = ThumbnailTask(self, self.latestId, fileName, width, height, mtime)
+            task.setAutoDelete(False)
+            self.tasks[(self.latestId, fileName)] = task
+            self.pool.start(task)
+
+    def cancel(self):
+        ''' drop the thumbnails that are still queued '''
+        self.latestId += 1
+        for key, task in list(self.tasks.items()):
+            if self.pool.tryTake(task):
+                del self.tasks[key]
+
+    def _onDecoded(self, requestId, fileName, mtime, image):
+        self.tasks.pop((requestId, fileName), None)
+        if requestId != self.latestId:
+            return  # stale result
+        if image.isNull():
+            self.thumbnailFailed.emit(fileName)
+            return
+        self.cache.put((fileName,) + self.size, image, ImageCache.imageBytes(image), mtime)
+        self.thumbnailLoaded.emit(fileName, image)
+
+    def _onUnchanged(self, requestId, fileName):
+        self.tasks.pop((requestId, fileName), None)
+
+    def shutdown(self):
+        self.latestId += 1
+        self.pool.clear()
+        self.pool.waitForDone()
+        self.tasks.clear()
+        self.cache.clear()
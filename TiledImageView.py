@@ -0,0 +1,175 @@
+'''
+Image viewer that only draws the part of the image that is on screen
+
+The image is cut into tiles on a mip-map pyramid: level 0 is the image,
+every next level is half the size of the one before. When painting, the
+level closest to (but not smaller than) the zoom is picked and only the tiles
+that cover the visible part of the view are converted to pixmaps and drawn,
+so zooming and panning cost is proportional to the viewport, not the image.
+Levels are made when first needed, tiles are kept in an ImageCache.
+
+Scene coordinates are pixels of the full resolution image, also when the
+image shown is a smaller preview, so the zoom does not jump when the full
+resolution replaces the preview.
+'''
+from math import floor, ceil, log2
+from PyQt5.QtWidgets import QGraphicsView, QGraphicsScene, QGraphicsItem, QStyleOptionGraphicsItem
+from PyQt5.QtGui import QImage, QPixmap, QPainter, QTransform
+from PyQt5.QtCore import Qt, QRectF, QSize, pyqtSignal
+from ImageCache import ImageCache
+
+TILE_SIZE = 512
+
+
+class ImagePyramid:
+    ''' an image and its downscaled levels, each half the size of the previous '''
+
+    def __init__(self, image):
+        self.levels = [image]
+        # stop at the level that fits in a single tile
+        size = max(image.width(), image.height())
+        self.numLevels = 1
+        while size > TILE_SIZE:
+            size = (size + 1) // 2
+            self.numLevels += 1
+
+    def level(self, level):
+        while len(self.levels) <= level:
+            previous = self.levels[-1]
+            self.levels.append(previous.scaled(max(1, (previous.width() + 1) // 2),
+                                               max(1, (previous.height() + 1) // 2),
+                                               Qt.IgnoreAspectRatio, Qt.SmoothTransformation))
+        return self.levels[level]
+
+
+class TiledImageItem(QGraphicsItem):
+    def __init__(self, tileCache=None):
+        super(TiledImageItem, self).__init__()
+        # exposedRect is only filled in with this flag
+        self.setFlag(QGraphicsItem.ItemUsesExtendedStyleOption)
+        self.tileCache = tileCache
+        self.image = QImage()
+        self.pyramid = None
+        self.fullSize = QSize()
+
+    def setImage(self, image, fullSize=None):
+        ''' shows image, scaled to fullSize if it is a preview of a larger image '''
+        self.prepareGeometryChange()
+        self.image = image
+        self.pyramid = ImagePyramid(image)
+        self.fullSize = fullSize if fullSize is not None and fullSize.isValid() else image.size()
+        self.update()
+
+    def boundingRect(self):
+        return QRectF(0, 0, self.fullSize.width(), self.fullSize.height())
+
+    def pickLevel(self, scale):
+        ''' pyramid level to draw at scale screen pixels per scene pixel '''
+        if self.image.isNull():
+            return 0
+        # screen pixels per pixel of the image itself
+        imageScale = scale * self.fullSize.width() / self.image.width()
+        if imageScale >= 1:
+            return 0
+        return min(int(floor(log2(1 / imageScale))), self.pyramid.numLevels - 1)
+
+    def tile(self, level, tx, ty):
+        key = (self.image.cacheKey(), level, tx, ty)
+        pixmap = self.tileCache.get(key) if self.tileCache is not None else None
+        if pixmap is None:
+            levelImage = self.pyramid.level(level)
+            x, y = tx * TILE_SIZE, ty * TILE_SIZE
+            # tiles at the right and bottom edge are smaller
+            pixmap = QPixmap.fromImage(levelImage.copy(
+                x, y, min(TILE_SIZE, levelImage.width() - x), min(TILE_SIZE, levelImage.height() - y)))
+            if self.tileCache is not None:
+                self.tileCache.put(key, pixmap, ImageCache.imageBytes(pixmap))
+        return pixmap
+
+    def paint(self, painter, option, widget=None):
+        if self.image.isNull():
+            return
+        scale = QStyleOptionGraphicsItem.levelOfDetailFromTransform(painter.worldTransform())
+        level = self.pickLevel(scale)
+        # smooth when scaling down, sharp pixels when zoomed in far
+        painter.setRenderHint(QPainter.SmoothPixmapTransform,
+                              scale * self.fullSize.width() / self.image.width() < 2)
+        levelImage = self.pyramid.level(level)
+        # scene pixels per pixel of this level
+        fx = self.fullSize.width() / levelImage.width()
+        fy = self.fullSize.height() / levelImage.height()
+
+        exposed = option.exposedRect.intersected(self.boundingRect())
+        numX = ceil(levelImage.width() / TILE_SIZE)
+        numY = ceil(levelImage.height() / TILE_SIZE)
+        for ty in range(max(0, int(exposed.top() / (fy * TILE_SIZE))),
+                        min(numY, int(ceil(exposed.bottom() / (fy * TILE_SIZE))))):
+            for tx in range(max(0, int(exposed.left() / (fx * TILE_SIZE))),
+                            min(numX, int(ceil(exposed.right() / (fx * TILE_SIZE))))):
+                pixmap = self.tile(level, tx, ty)
+                target = QRectF(tx * TILE_SIZE * fx, ty * TILE_SIZE * fy,
+                                pixmap.width() * fx, pixmap.height() * fy)
+                painter.drawPixmap(target, pixmap, QRectF(pixmap.rect()))
+
+
+class TiledImageView(QGraphicsView):
+    # zoom in screen pixels per pixel of the full resolution image
+    zoomChanged = pyqtSignal(float)
+
+    def __init__(self, parent=None, tileCache=None):
+        super(TiledImageView, self).__init__(parent)
+        self.setScene(QGraphicsScene(self))
+        self.item = TiledImageItem(tileCache)
+        self.scene().addItem(self.item)
+        self.fit = False
+
+        self.setBackgroundBrush(self.palette().dark())
+        self.setRenderHint(QPainter.SmoothPixmapTransform)
+        self.setTransformationAnchor(QGraphicsView.AnchorViewCenter)
+        self.setResizeAnchor(QGraphicsView.AnchorViewCenter)
+        self.setDragMode(QGraphicsView.ScrollHandDrag)
+
+    def setTileCache(self, tileCache):
+        self.item.tileCache = tileCache
+
+    def setImage(self, image, fullSize=None):
+        ''' shows image, keeps the zoom unless fitting to the window '''
+        self.item.setImage(image, fullSize)
+        self.scene().setSceneRect(self.item.boundingRect())
+        if self.fit:
+            self.fitToWindow()
+
+    def image(self):
+        return self.item.image
+
+    def zoom(self):
+        return self.transform().m11()
+
+    def setZoom(self, factor):
+        self.setTransform(QTransform.fromScale(factor, factor))
+        self.zoomChanged.emit(factor)
+
+    def displayScale(self):
+        ''' screen pixels per pixel of the image shown, above 1 a preview looks blurry '''
+        image = self.item.image
+        if image.isNull():
+            return 0.0
+        return self.zoom() * self.item.fullSize.width() / image.width()
+
+    def setFit(self, fit):
+        ''' keep the whole image in the window, also when it is resized '''
+        self.fit = fit
+        if fit:
+            self.fitToWindow()
+
+    def fitToWindow(self):
+        if self.item.image.isNull():
+            return
+        # only the transform changes, the tiles are drawn at the new size on the next paint
+        self.fitInView(self.item, Qt.KeepAspectRatio)
+        self.zoomChanged.emit(self.zoom())
+
+    def resizeEvent(self, event):
+        super(TiledImageView, self).resizeEvent(event)
+        if self.fit:
+            self.fitToWindow()
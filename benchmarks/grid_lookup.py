@@ -0,0 +1,70 @@
+'''
+Compares the dense grid index against the boolean mask scan that
+SolutionBrowser.updateImage used to do on every slider tick.
+
+usage: python benchmarks/grid_lookup.py [numSims]
+'''
+import os
+import sys
+import time
+import itertools
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from BatchIndex import BatchIndex  # noqa: E402
+
+
+def make_batch(numSims):
+    # sweep over 4 parameters, roughly numSims combinations
+    n = max(2, int(round(numSims ** 0.25)))
+    axes = [np.linspace(1, 10, n), np.linspace(0.3, 0.49, n),
+            np.arange(n, dtype=float), np.logspace(2, 5, n)]
+    rows = np.array(list(itertools.product(*axes)))
+    parData = pd.DataFrame(rows, columns=['E', 'nu', 'L', 'f'])
+    parData.insert(0, 'SimNum', np.arange(1, rows.shape[0] + 1))
+    return parData, ['E', 'nu', 'L', 'f']
+
+
+def mask_scan(parData, parNames, uniqueVals, valIndices):
+    parValues = [uniqueVals[idx][val] for idx, val in enumerate(valIndices)]
+    criteria_list = []
+    for idx, name in enumerate(parNames):
+        df = parData[name] == parValues[idx]
+        criteria_list.append(df.values)
+    critArray = np.array(criteria_list).transpose()
+    row = critArray.all(axis=1)
+    return parData[pd.Series(row)].index[0]
+
+
+def timeit(func, queries):
+    t0 = time.perf_counter()
+    for q in queries:
+        func(q)
+    return (time.perf_counter() - t0) / len(queries)
+
+
+if __name__ == '__main__':
+    numSims = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    parData, parNames = make_batch(numSims)
+
+    t0 = time.perf_counter()
+    codes, uniqueVals = BatchIndex.build_codes(parData, parNames)
+    index = BatchIndex(parData['SimNum'].values, parNames, codes, uniqueVals)
+    buildTime = time.perf_counter() - t0
+
+    rng = np.random.default_rng(0)
+    queries = [[int(rng.integers(len(u))) for u in index.uniqueVals] for _ in range(200)]
+
+    # both methods should agree
+    for q in queries[:20]:
+        assert index.getRowIndex(q) == mask_scan(parData, parNames, index.uniqueVals, q)
+
+    tMask = timeit(lambda q: mask_scan(parData, parNames, index.uniqueVals, q), queries)
+    tGrid = timeit(index.getRowIndex, queries)
+
+    print('sims: %i, parameters: %i' % (parData.shape[0], len(parNames)))
+    print('grid build : %8.3f ms (once per batch)' % (buildTime * 1e3))
+    print('mask scan  : %8.3f ms per lookup' % (tMask * 1e3))
+    print('grid index : %8.3f ms per lookup' % (tGrid * 1e3))
+    print('speedup    : %8.0fx' % (tMask / tGrid))
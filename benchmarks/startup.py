@@ -0,0 +1,58 @@
+'''
+Startup budget check: imports the GUI, creates the window and waits until
+the first batch is open, then prints the startup timing report. Fails (exit
+code 1) when the window took longer than the budget to come up, i.e. until
+the event loop ran for the first time, or when pandas, scipy or h5py were
+imported before that. The batch opens in the background after that and is
+only reported.
+
+usage: python benchmarks/startup.py [budget_ms] [batch]
+
+Without a display, run with QT_QPA_PLATFORM=offscreen. Without a batch, the
+default_set of the config file is opened.
+'''
+import time
+START = time.perf_counter()
+
+import os  # noqa: E402
+import sys  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from PyQt5.QtWidgets import QApplication  # noqa: E402
+from PyQt5.QtCore import QTimer, QThreadPool  # noqa: E402
+from mySolutionBrowser import SolutionBrowser, StartupTimer  # noqa: E402
+
+DEFAULT_BUDGET_MS = 1000
+# give up waiting for the batch after this long
+TIMEOUT_MS = 60000
+
+
+if __name__ == '__main__':
+    budget = float(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_BUDGET_MS
+    batchToLoad = sys.argv[2] if len(sys.argv) > 2 else None
+
+    timer = StartupTimer(START)
+    timer.mark('imports')
+    # the config file and default.jpg are next to the GUI
+    os.chdir(ROOT)
+    app = QApplication(sys.argv[:1])
+    timer.mark('QApplication')
+    w = SolutionBrowser(batchToLoad, timer)
+    w.show()
+    timer.mark('show')
+    timer.onFinished = app.quit
+    QTimer.singleShot(TIMEOUT_MS, app.quit)
+    app.exec_()
+    w.close()
+    # background work of the batch, e.g. the file scan, still running
+    QThreadPool.globalInstance().waitForDone()
+
+    windowTime = timer.elapsed('event loop')
+    if windowTime is None:
+        print('window did not come up within %i ms' % TIMEOUT_MS)
+        sys.exit(1)
+    print('window up after %.0f ms, budget %.0f ms' % (1000 * windowTime, budget))
+    # the batch is opened once the event loop runs, nothing heavy before that.
+    # The report lists the modules that were imported too early
+    sys.exit(0 if 1000 * windowTime <= budget and not timer.imported else 1)
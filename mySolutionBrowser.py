@@ -4,25 +4,84 @@ GUI to explore simulation results
 Rick Waasdorp, 29-07-2019
 v1.2 (not really consistent in updating)
 '''
+import time
+# for the startup timing report, see StartupTimer
+IMPORT_START = time.perf_counter()
 
 from PyQt5.QtWidgets import (QApplication, QFrame, QGridLayout, QHBoxLayout, QPushButton, 
-                            QSizePolicy, QComboBox, QSpacerItem, QSlider, QStyle,
+                            QComboBox, QSpacerItem, QSlider, QStyle,
                              QToolButton, QVBoxLayout, QWidget, QMainWindow, QMenu, QAction, 
-                             QLabel, QMessageBox, QScrollArea, QFileDialog, QTextBrowser, QShortcut)
-from PyQt5.QtGui import QImage, QPainter, QPalette, QPixmap, QFont, QKeySequence, QIcon
-from PyQt5.QtCore import QDir, Qt, QSize
+                             QLabel, QMessageBox, QFileDialog, QShortcut,
+                             QDockWidget, QProgressBar)
+from PyQt5.QtWidgets import QTableView, QHeaderView, QLineEdit
+from PyQt5.QtGui import QImage, QPainter, QFont, QKeySequence, QIcon, QColor
+from PyQt5.QtCore import QDir, Qt, QSize, QAbstractTableModel, QModelIndex, QSortFilterProxyModel, QTimer
 from math import floor, ceil
-from MatFileLoader import MatFileLoader
+from BatchQuery import BatchQuery
+from ImageLoader import ImageLoader
+from ImageCache import ImageCache
+from ThumbnailLoader import ThumbnailLoader
+from SweepView import SweepView
+from Playback import FramePipeline
+from GifPlayer import GifPlayer
+from TiledImageView import TiledImageView
+from collections import deque
+from BackgroundTask import BackgroundTask
+from ParameterTable import format_value, list_parameters
+from ParameterLoader import ParameterLoader
+from SolutionBrowserCore import Batch, BatchSettings, read_config
 from time import sleep
 import os
-import time
-import configparser
-import pandas as pd
+import sys
 import numpy as np
-try:
-    from ahk import AHK
-except ImportError:
-    AHK = None
+
+# number of sims listed in the metric ranking menu
+TOP_N = 10
+# formatted parameter texts kept for the last sims shown in the parameter dialog
+PARAMETER_TEXT_ENTRIES = 64
+# zoom limits, in screen pixels per image pixel
+MAX_ZOOM = 32.0
+MIN_ZOOM = 0.05
+# only needed once a batch is open, not imported before the window is up
+HEAVY_MODULES = ('pandas', 'scipy', 'h5py')
+
+
+class StartupTimer:
+    ''' duration of every startup phase, printed with --startup-timing '''
+
+    def __init__(self, start=IMPORT_START):
+        self.start = self.last = start
+        self.phases = []
+        # heavy modules that were imported when the window came up
+        self.imported = None
+        # called when the first batch is open
+        self.onFinished = None
+
+    def mark(self, phase):
+        ''' ends phase, it started at the previous mark '''
+        now = time.perf_counter()
+        self.phases.append((phase, now - self.last))
+        self.last = now
+
+    def checkImports(self):
+        ''' records which of HEAVY_MODULES are imported by now '''
+        self.imported = [name for name in HEAVY_MODULES if name in sys.modules]
+
+    def elapsed(self, phase):
+        ''' seconds from the start until the end of phase, None if not reached '''
+        for idx, (name, _) in enumerate(self.phases):
+            if name == phase:
+                return sum(seconds for _, seconds in self.phases[:idx + 1])
+        return None
+
+    def finish(self):
+        for phase, seconds in self.phases:
+            print('%-20s %8.1f ms' % (phase, 1000 * seconds))
+        if self.imported:
+            print('imported at startup: %s' % ', '.join(self.imported))
+        print('%-20s %8.1f ms' % ('total', 1000 * (self.last - self.start)))
+        if self.onFinished:
+            self.onFinished()
 
 
 class JumpSlider(QSlider):
@@ -65,15 +124,17 @@ class CtrlButton(QPushButton):
 
 
 class SolutionBrowser(QMainWindow):
-    def __init__(self, setToLoad=None):
+    def __init__(self, setToLoad=None, startupTimer=None):
         super(SolutionBrowser, self).__init__()
+        self.startupTimer = startupTimer
 
         # parse config
         self.parse_config()
+        self.markStartup('config')
 
         # overwrite default set if provided
         if setToLoad:
-            self.default_set = setToLoad
+            self.settings.default_set = setToLoad
 
         # set size mainwindow
         self.setWindowTitle('Solution Browser')
@@ -96,6 +157,11 @@ class SolutionBrowser(QMainWindow):
         self.statusbar_style_normal = "QStatusBar{font-size:10pt;color:black;font-weight:bold;}"
         self.statusbar.setStyleSheet(self.statusbar_style_normal)
         self.statusbar.showMessage('Starting SolutionBrowser')
+        # progress of opening a batch and of the other background work
+        self.progressBar = QProgressBar(self.statusbar)
+        self.progressBar.setMaximumWidth(200)
+        self.progressBar.hide()
+        self.statusbar.addPermanentWidget(self.progressBar)
 
         # load layout top and bottom frames
         self.layouts = SolutionBrowserLayout(self)
@@ -103,54 +169,104 @@ class SolutionBrowser(QMainWindow):
 
         self.createActions()
         self.createMenus()
+        self.markStartup('window')
 
-        # create par dialog
+        # create par dialog, P is loaded in the background
         self.parDialogOpen = False
         self.parDialog = ParDialog(self)
+        self.parameterLoader = ParameterLoader(parent=self)
+        self.parameterLoader.parametersLoaded.connect(self.parametersLoaded)
 
         # get frames for easy reference.
         self.ImageViewerFrame = self.layouts.ImageViewerFrame
         self.ParameterFrame = self.layouts.ParameterFrame
         self.ParameterFrame.setFont(font)
 
-        # start image viewer
+        # start image viewer and background image decoding
         self.setup_image_viewer()
+        self.imageLoader = ImageLoader(numWorkers=self.decode_workers,
+                                       cacheBytes=self.image_cache_mb * 2**20, parent=self)
+        self.pixmapCache = ImageCache(self.pixmap_cache_mb * 2**20)
+        if self.pixmap_cache_mb > 0:
+            self.imageView.setTileCache(self.pixmapCache)
+        self.imageLoader.imageLoaded.connect(self.imageLoaded)
+        self.imageLoader.imageFailed.connect(self.imageFailed)
+        # small multiples of a sweep, shown instead of the image
+        self.thumbnailLoader = ThumbnailLoader(numWorkers=self.thumbnail_workers or None,
+                                               cacheBytes=self.thumbnail_cache_mb * 2**20,
+                                               parent=self)
+        self.sweepView = SweepView(self.thumbnailLoader, self.ImageViewerFrame)
+        self.sweepView.simSelected.connect(self.sweepSimSelected)
+        self.sweepView.hide()
+        self.ImageViewerFrame.layout().addWidget(self.sweepView)
+        # playback, frames are decoded ahead of the playhead
+        self.framePipeline = FramePipeline(self.play_workers, self.play_buffer, parent=self)
+        self.playTimer = QTimer(self)
+        self.playTimer.timeout.connect(self.playbackTick)
+        # gif of the current sim in a dock, follows the sim number
+        self.gifPlayer = GifPlayer(self.hsize // 3, self.vsize // 2, streaming=self.gif_streaming,
+                                   bufferSize=self.gif_buffer)
+        self.gifDock = QDockWidget('Gif', self)
+        self.gifDock.setWidget(self.gifPlayer)
+        self.gifDock.visibilityChanged.connect(self.gifDockVisibilityChanged)
+        self.addDockWidget(Qt.RightDockWidgetArea, self.gifDock)
+        self.gifDock.hide()
+        self.markStartup('viewer and loaders')
+
+        # ahk to communicate with matlab, imported on first use
+        self.ahk = None
+
+        # show the window first, the batch is opened in the background after
+        self.batch = None
+        self.previewCache = None
+        QTimer.singleShot(0, self.startup)
+
+    def markStartup(self, phase):
+        if self.startupTimer is not None:
+            self.startupTimer.mark(phase)
+
+    def startup(self):
+        # first thing the event loop runs, the window is up
+        self.markStartup('event loop')
+        if self.startupTimer is not None:
+            self.startupTimer.checkImports()
         # load default image
         self.open_image('default.jpg')
+        if self.settings.default_set:
+            self.open_batch(batchFolder=self.settings.default_set)
+        else:
+            self.open_batch()
 
-        # start parameter selection tool
-        self.setup_parameter_selector()
+    def finishStartup(self):
+        if self.startupTimer is not None:
+            self.startupTimer.finish()
+            self.startupTimer = None
 
-        # ahk to communicate with matlab
-        if AHK:
-            self.ahk = AHK(executable_path=self.ahk_executable_path)
-
-    def resizeEvent(self, event):
-        self.fitToWindow(True)
+    def closeEvent(self, event):
+        # stop decoding before the window goes away
+        self.playTimer.stop()
+        self.framePipeline.shutdown()
+        self.gifPlayer.clear()
+        self.imageLoader.shutdown()
+        self.thumbnailLoader.shutdown()
+        self.parameterLoader.shutdown()
+        super(SolutionBrowser, self).closeEvent(event)
 
     def setup_image_viewer(self):
-        self.scaleFactor = 0.0
-        self.reuseScaleFactor = None
-
-        self.imageLabel = QLabel(self.ImageViewerFrame)
-        self.imageLabel.setBackgroundRole(QPalette.Base)
-        self.imageLabel.setSizePolicy(QSizePolicy.Ignored, QSizePolicy.Ignored)
-        self.imageLabel.setScaledContents(True)
+        # a preview is shown until zooming needs the full resolution
+        self.showingPreview = False
+        self.currentImage = QImage()
 
-        self.scrollArea = QScrollArea(self.ImageViewerFrame)
-        self.scrollArea.setBackgroundRole(QPalette.Dark)
-        self.scrollArea.setWidget(self.imageLabel)
+        # draws only the visible tiles, drag to pan
+        self.imageView = TiledImageView(self.ImageViewerFrame)
+        self.imageView.zoomChanged.connect(self.zoomChanged)
 
         layout = QHBoxLayout()
-        layout.addWidget(self.scrollArea)  # do not add image label
+        layout.addWidget(self.imageView)
         layout.setContentsMargins(1, 1, 1, 1)
         self.ImageViewerFrame.setLayout(layout)
 
     def setup_parameter_selector(self):
-        if self.default_set:
-            self.open_batch(batchFolder=self.default_set)
-        else:
-            self.open_batch()
         # init h layout
         layout = QHBoxLayout()
 
@@ -175,6 +291,7 @@ class SolutionBrowser(QMainWindow):
         ov_frame, simnum_label = self.createOverviewGroup()
         self.simnumLabel = simnum_label
         layout.addWidget(ov_frame)
+        self.updateFilterWidgets()
 
         layout.setContentsMargins(1, 1, 1, 1)
         self.ParameterFrame.setLayout(layout)
@@ -183,6 +300,16 @@ class SolutionBrowser(QMainWindow):
         self.updateImage()
         self.updateOverviewGroup()
 
+    def clear_parameter_selector(self):
+        # remove the sliders and overview of the previous batch
+        layout = self.ParameterFrame.layout()
+        while layout.count():
+            widget = layout.takeAt(0).widget()
+            if widget is not None:
+                widget.deleteLater()
+        # the frame only takes a new layout once the old one moved elsewhere
+        QWidget().setLayout(layout)
+
     def createOverviewGroup(self):
         # init frame and layout
         frame = QFrame(self.ParameterFrame)
@@ -225,6 +352,32 @@ class SolutionBrowser(QMainWindow):
         par_but = QPushButton('Parameters', frame)
         par_but.clicked.connect(self.viewParameters)
 
+        # filter on parameters, e.g. E > 1e3 and nu < 0.45
+        self.filterEdit = QLineEdit(frame)
+        self.filterEdit.setPlaceholderText('Filter, e.g. E > 1e3 and nu < 0.45')
+        self.filterEdit.setClearButtonEnabled(True)
+        self.filterEdit.returnPressed.connect(self.applyFilter)
+        self.hitsLabel = QLabel(frame)
+
+        # rank the sims by a metric, the menu lists the best and worst
+        self.metricBox = QComboBox(frame)
+        self.metricBox.addItems(list(self.settings.metrics))
+        self.metricBox.setToolTip('Metric to rank the simulations by')
+        rank_but = QToolButton(frame)
+        rank_but.setText('Top %i' % TOP_N)
+        rank_but.setPopupMode(QToolButton.InstantPopup)
+        rank_but.setMenu(QMenu(rank_but))
+        rank_but.menu().aboutToShow.connect(lambda: self.createRankingMenu(rank_but.menu()))
+
+        # play along a parameter axis or through the sim numbers
+        self.playAxisBox = QComboBox(frame)
+        self.playAxisBox.addItems(['SimNum'] + list(self.parNames))
+        self.playAxisBox.setToolTip('Play along this parameter, at %g fps' % self.play_fps)
+        self.playButton = QPushButton(frame)
+        self.playButton.setCheckable(True)
+        self.playButton.setIcon(self.style().standardIcon(QStyle.SP_MediaPlay))
+        self.playButton.toggled.connect(self.togglePlayback)
+
         # add things layout
         grid_layout.addWidget(simnum_label, 0, 0, 1, 1)
         grid_layout.addWidget(par_but, 0, 1, 1, 1)
@@ -232,6 +385,12 @@ class SolutionBrowser(QMainWindow):
         grid_layout.addWidget(next_but, 1, 1, 1, 1)
         grid_layout.addWidget(load_but, 2, 0, 1, 1)
         grid_layout.addWidget(view_gif_but, 2, 1, 1, 1)
+        grid_layout.addWidget(self.filterEdit, 3, 0, 1, 2)
+        grid_layout.addWidget(self.hitsLabel, 4, 0, 1, 2)
+        grid_layout.addWidget(self.metricBox, 5, 0, 1, 1)
+        grid_layout.addWidget(rank_but, 5, 1, 1, 1)
+        grid_layout.addWidget(self.playAxisBox, 6, 0, 1, 1)
+        grid_layout.addWidget(self.playButton, 6, 1, 1, 1)
 
         return frame, simnum_label
 
@@ -242,8 +401,9 @@ class SolutionBrowser(QMainWindow):
             if sender.isCtrlPressed():
                 inc = 10
 
-        if self.simNum <= self.totalNumSims - inc:
-            self.simNum += inc
+        simNum = self.findNextSim(self.simNum + inc, 1)
+        if simNum <= self.totalNumSims:
+            self.simNum = simNum
             self.updateImage(self.simNum)
             self.updateSliders()
         else:
@@ -257,14 +417,103 @@ class SolutionBrowser(QMainWindow):
             if sender.isCtrlPressed():
                 inc = 10
 
-        if self.simNum >= inc + 1:
-            self.simNum -= inc
+        simNum = self.findNextSim(self.simNum - inc, -1)
+        if simNum >= 1:
+            self.simNum = simNum
             self.updateImage(self.simNum)
             self.updateSliders()
         else:
             self.statusbar.showMessage('First simulation reached')
             self.statusbar.setStyleSheet(self.statusbar_style_alert)
 
+    def findNextSim(self, simNum, step):
+        # skip sims that do not match the filter
+        if self.filterRows is not None:
+            # sorted hits, jump straight to the first one in the step direction
+            if step > 0:
+                pos = np.searchsorted(self.filterRows, simNum - 1)
+                simNum = self.filterRows[pos] + 1 if pos < len(self.filterRows) else self.totalNumSims + 1
+            else:
+                pos = np.searchsorted(self.filterRows, simNum - 1, side='right') - 1
+                simNum = self.filterRows[pos] + 1 if pos >= 0 else 0
+        # skip sims without an image once the batch files are scanned
+        hasImage = self.batchIndex.fileExists
+        if hasImage is not None:
+            hasImage = hasImage['img']
+            while 1 <= simNum <= self.totalNumSims and (not hasImage[simNum - 1]
+                                                        or not self.isHit(simNum - 1)):
+                simNum += step
+        return int(simNum)
+
+    def isHit(self, row_idx):
+        return self.filterMask is None or bool(self.filterMask[row_idx])
+
+    def applyFilter(self):
+        expression = self.filterEdit.text().strip()
+        if expression:
+            query = BatchQuery(self.batchIndex, {'P': self.parameterTable,
+                                                 'M': self.metricTable})
+            try:
+                mask = query.evaluate(expression)
+            except Exception as e:
+                # anything numpy raises on odd input too, an exception must not leave the slot
+                self.hitsLabel.setText('Invalid filter: %s' % e)
+                self.statusbar.showMessage(str(e))
+                self.statusbar.setStyleSheet(self.statusbar_style_alert)
+                return
+            if not mask.any():
+                self.statusbar.showMessage('No simulations match the filter')
+                self.statusbar.setStyleSheet(self.statusbar_style_alert)
+                return
+            self.filterMask = mask
+            self.filterRows = np.flatnonzero(mask)
+        else:
+            self.filterMask = None
+            self.filterRows = None
+        self.updateFilterWidgets()
+
+        # move to the nearest hit if the current sim is filtered out
+        if not self.isHit(self.simNum - 1):
+            self.updateImage()
+
+    def createRankingMenu(self, menu):
+        # highest and lowest sims for the selected metric, within the filter
+        menu.clear()
+        name = self.metricBox.currentText()
+        if self.metricTable is None or not name:
+            menu.addAction('Extract metrics first (File menu)').setEnabled(False)
+            return
+        values = self.metricTable.align(self.batchIndex.simNums)
+        values = values[:, self.metricTable.names.index(name)]
+        rows = np.arange(self.totalNumSims) if self.filterRows is None else self.filterRows
+        rows = rows[~np.isnan(values[rows])]
+        order = rows[np.argsort(values[rows], kind='stable')]
+        for title, ranked in (('Highest', order[::-1][:TOP_N]), ('Lowest', order[:TOP_N])):
+            menu.addSection('%s %s' % (title, name))
+            for row_idx in ranked.tolist():
+                action = menu.addAction('%03i\t%s' % (row_idx + 1, format_value(values[row_idx])))
+                action.triggered.connect(lambda checked, simNum=row_idx + 1: self.jumpToSim(simNum))
+        if not len(order):
+            menu.addAction('No values').setEnabled(False)
+
+    def jumpToSim(self, simNum):
+        self.simNum = simNum
+        self.updateImage(self.simNum)
+        self.updateSliders()
+
+    def updateFilterWidgets(self):
+        # hit count, and grey out the values without hits
+        numHits = self.totalNumSims if self.filterRows is None else len(self.filterRows)
+        self.hitsLabel.setText('Hits: %i / %i' % (numHits, self.totalNumSims))
+        for parIdx, box in enumerate(self.parBoxes):
+            if self.filterRows is None:
+                hasHits = np.ones(box.count(), dtype=bool)
+            else:
+                codes = self.batchIndex.codes[self.filterRows, parIdx]
+                hasHits = np.bincount(codes, minlength=box.count()) > 0
+            for valIdx in range(box.count()):
+                box.model().item(valIdx).setEnabled(bool(hasHits[valIdx]))
+
     def updateOverviewGroup(self):
         # update simnum label
         self.simnumLabel.setText('Sim num: %03i' % self.simNum)
@@ -274,48 +523,99 @@ class SolutionBrowser(QMainWindow):
 
         # if parDialog open, update it
         if self.parDialogOpen:
-            text = self.getParameterText()
-            self.parDialog.updateText(text)
+            self.requestParameters()
+        # same for the gif
+        if self.gifDock.isVisible():
+            self.showGif()
+
+    def requestParameters(self):
+        # load P of the current sim and its neighbours in the background
+        row_idx = self.simNum - 1
+        self.parameterLoader.request(self.batchIndex.getFile('mat', row_idx))
+        rows = self.batchIndex.getNeighbours(row_idx, 1)
+        self.parameterLoader.prefetch(self.batchIndex.getFiles('mat', rows))
+
+    def parametersLoaded(self, matFile, P, error):
+        if self.parDialogOpen:
+            self.parDialog.updateParameters(P, error)
 
     def loadInMatlab(self):
         # get the name of the current file
         row_idx = self.simNum - 1
-        matFileName = self.parData['matFile'].iloc[row_idx]
+        matFileName = self.batchIndex.getFile('mat', row_idx)
+        if self.batchIndex.hasFile('mat', row_idx) is False:
+            self.statusbar.showMessage('Workspace does not exist for %03i...' % self.simNum)
+            self.statusbar.setStyleSheet(self.statusbar_style_alert)
+            return
 
         # open matlab. Expects ahk script to be running on system.
         # script maps ctrl + m to open matlab command window
-        if hasattr(self, 'ahk'):
-            self.ahk.send('^m')
+        ahk = self.getAhk()
+        if ahk is not None:
+            ahk.send('^m')
             sleep(0.100)  # short delay
-            self.ahk.type('clear;load(\'' + matFileName + '\');')
-            self.ahk.send('{Enter}')
+            ahk.type('clear;load(\'' + matFileName + '\');')
+            ahk.send('{Enter}')
         else:
             self.statusbar.showMessage(
                 'AHK not found! Could not import AHK, make sure it is installed.')
 
+    def getAhk(self):
+        # ahk is optional and slow to import, only when first loading in matlab
+        if self.ahk is None:
+            try:
+                from ahk import AHK
+            except ImportError:
+                return None
+            self.ahk = AHK(executable_path=self.ahk_executable_path)
+        return self.ahk
+
     def viewParameters(self):
         if not self.parDialogOpen:
             # create new window
             self.parDialogOpen = True
             self.parDialog.show()
-            # put in the text
-            text = self.getParameterText()
-            self.parDialog.updateText(text)
+            # put in the text when loaded
+            self.requestParameters()
         else:
             self.parDialog.close()
 
     def viewGif(self):
+        # toggle the gif dock, it shows the gif of the current sim
+        if self.gifDock.isVisible():
+            self.gifDock.close()
+        else:
+            self.gifDock.show()
+            self.showGif()
+
+    def showGif(self):
         # get the name of the current file
         row_idx = self.simNum - 1
-        gifFileName = self.parData['gifFile'].iloc[row_idx]
-
-        # check if file exist:
-        if os.path.isfile(gifFileName):
-            os.startfile(gifFileName, 'open')
+        gifFileName = self.batchIndex.getFile('gif', row_idx)
+
+        # check if file exist, from the file scan if available
+        gifExists = self.batchIndex.hasFile('gif', row_idx)
+        if gifExists is None:
+            gifExists = os.path.isfile(gifFileName)
+        if gifExists:
+            if gifFileName != self.gifPlayer.fileName:
+                self.gifPlayer.load_gif(gifFileName)
         else:
+            self.gifPlayer.showMessage('No gif for %03i' % self.simNum)
             self.statusbar.showMessage('GIF does not exist for %03i...' % self.simNum)
             self.statusbar.setStyleSheet(self.statusbar_style_alert)
 
+        # decode the gifs of the previous and next sim ahead of time
+        rows = [self.findNextSim(self.simNum + step, step) - 1 for step in (1, -1)]
+        rows = [r for r in rows if 0 <= r < self.totalNumSims
+                and self.batchIndex.hasFile('gif', r) is not False]
+        self.gifPlayer.preload(self.batchIndex.getFiles('gif', rows).tolist())
+
+    def gifDockVisibilityChanged(self, visible):
+        # no decoding in the background while the dock is closed
+        if not visible and not self.gifDock.isVisible():
+            self.gifPlayer.clear()
+
     def createSliderGroup(self, idx, parameterName, parameterValues):
         # init frame and layout
         frame = QFrame(self.ParameterFrame)
@@ -370,147 +670,317 @@ class SolutionBrowser(QMainWindow):
             self.updateImage()
 
     def updateSliders(self):
-        # get par values based on row idx
+        # get slider indices based on row idx from the precomputed code matrix
         row_idx = self.simNum - 1
-        data_row = self.parData.iloc[row_idx]
-
-        # need to determine parameter unique value valIndex based on sim number
-        # get values based on index
-        for idx, name in enumerate(self.parNames):
-            value = self.parData[name].iloc[row_idx]
-            result = np.where(self.uniqueVals[idx] == value)
-            self.valIndices[idx] = int(result[0])
+        self.valIndices = self.batchIndex.getValIndices(row_idx).tolist()
 
-        # update sliders
+        # update sliders and boxes without triggering valChange for every parameter
         for parIdx, valIdx in enumerate(self.valIndices):
+            for widget in (self.parSliders[parIdx], self.parBoxes[parIdx]):
+                widget.blockSignals(True)
             self.parSliders[parIdx].setValue(valIdx)
+            self.parBoxes[parIdx].setCurrentIndex(valIdx)
+            for widget in (self.parSliders[parIdx], self.parBoxes[parIdx]):
+                widget.blockSignals(False)
+
+    def togglePlayback(self, checked):
+        if checked:
+            self.startPlayback()
+        else:
+            self.stopPlayback()
+
+    def playbackRows(self):
+        # frames to play, the sims along the axis through the current sim
+        axis = self.playAxisBox.currentIndex() - 1
+        if axis < 0:
+            rows = np.arange(self.totalNumSims)
+        else:
+            valIndices = np.tile(self.batchIndex.getValIndices(self.simNum - 1),
+                                 (len(self.uniqueVals[axis]), 1))
+            valIndices[:, axis] = np.arange(len(self.uniqueVals[axis]))
+            rows = np.asarray(self.batchIndex.getRowIndex(valIndices))
+            rows = rows[rows >= 0]
+        if self.filterMask is not None:
+            rows = rows[self.filterMask[rows]]
+        if self.batchIndex.fileExists is not None:
+            rows = rows[self.batchIndex.fileExists['img'][rows]]
+        return rows
+
+    def startPlayback(self):
+        rows = self.playbackRows()
+        if len(rows) < 2:
+            self.statusbar.showMessage('Nothing to play along %s' % self.playAxisBox.currentText())
+            self.statusbar.setStyleSheet(self.statusbar_style_alert)
+            self.playButton.setChecked(False)
+            return
+        self.playRows = rows
+        self.playButton.setIcon(self.style().standardIcon(QStyle.SP_MediaPause))
+        # start at the current sim, the rows are in axis order, not sorted.
+        # Previews are decoded when there are any
+        current = np.flatnonzero(rows == self.simNum - 1)
+        start = int(current[0]) if len(current) else 0
+        self.framePipeline.start(lambda frame: self.batchIndex.getFile('img', rows[frame]),
+                                 len(rows), start)
+        self.playShown = deque(maxlen=max(2, int(2 * self.play_fps)))
+        self.playDropped = 0
+        self.playTimer.start(int(round(1000 / self.play_fps)))
+
+    def stopPlayback(self):
+        if not self.playTimer.isActive():
+            return
+        self.playTimer.stop()
+        self.framePipeline.stop()
+        self.playButton.setIcon(self.style().standardIcon(QStyle.SP_MediaPlay))
+        self.playButton.setChecked(False)
+        self.updateOverviewGroup()
+
+    def playbackTick(self):
+        frame = self.framePipeline.take()
+        if frame is None:
+            # not decoded in time, storage or decoding is the bottleneck
+            self.playDropped += 1
+        else:
+            frame, image, fullSize = frame
+            row_idx = int(self.playRows[frame])
+            self.simNum = row_idx + 1
+            self.simImgPath = self.batchIndex.getFile('img', row_idx)
+            if not image.isNull():
+                self.imageLoaded(self.simImgPath, image, fullSize)
+            self.updateSliders()
+            self.simnumLabel.setText('Sim num: %03i' % self.simNum)
+            self.playShown.append(time.perf_counter())
+
+        shown = self.playShown
+        fps = (len(shown) - 1) / (shown[-1] - shown[0]) if len(shown) > 1 and shown[-1] > shown[0] else 0
+        self.statusbar.setStyleSheet(self.statusbar_style_normal)
+        self.statusbar.showMessage('Playing %s: %.1f fps (target %g), %i frames dropped'
+                                   % (self.playAxisBox.currentText(), fps, self.play_fps,
+                                      self.playDropped))
 
     def updateImage(self, simNum=None):
+        # navigating by hand stops the playback
+        self.stopPlayback()
         # if sim num provided skip first section
+        nearestReason = None
         if not simNum:
-            # get values based on index
-            parValues = [None] * len(self.valIndices)
-            for idx, val in enumerate(self.valIndices):
-                parValues[idx] = self.uniqueVals[idx][val]
-
-            # select the right row:
-            criteria_list = []
-            for idx, name in enumerate(self.parNames):
-                df = self.parData[name] == parValues[idx]
-                criteria_list.append(df.values)
-
-            critArray = np.array(criteria_list).transpose()
-            row = critArray.all(axis=1)
-            row_idx = self.parData[pd.Series(row)].index[0]
+            # select the right row from the grid index
+            row_idx = self.batchIndex.getRowIndex(self.valIndices)
+            if row_idx < 0 or not self.isHit(row_idx):
+                # combination not simulated or filtered out, jump to the nearest one
+                nearestReason = 'not simulated' if row_idx < 0 else 'does not match the filter'
+                row_idx = self.batchIndex.getNearestRow(self.valIndices, self.filterRows)
+                self.simNum = row_idx + 1
+                self.updateSliders()
             simNum = row_idx + 1
         else:
             row_idx = simNum - 1
-        imgFileName = self.parData['imgFile'].iloc[row_idx]
+        imgFileName = self.batchIndex.getFile('img', row_idx)
         # set the simNum
         self.simNum = simNum
         self.simImgPath = imgFileName
         # update the label with the new simNim
         self.updateOverviewGroup()
+        if nearestReason:
+            self.statusbar.showMessage('Combination %s, showing nearest simulation %03i: %s'
+                                       % (nearestReason, simNum, imgFileName))
+
+        # decode the image in the background, shown when it arrives
+        if self.batchIndex.hasFile('img', row_idx) is False:
+            self.imageLoader.cancel()
+            self.statusbar.showMessage('No image for %03i: %s' % (simNum, imgFileName))
+            self.statusbar.setStyleSheet(self.statusbar_style_alert)
+        else:
+            # the largest preview if there is one, looked up by the loader
+            self.imageLoader.request(imgFileName, preview=True)
+
+        # decode the neighbours in parameter space ahead of time
+        if self.prefetch_depth > 0:
+            rows = self.batchIndex.getNeighbours(row_idx, self.prefetch_depth)
+            rows = [r for r in rows if self.batchIndex.hasFile('img', r) is not False]
+            self.imageLoader.prefetch(self.batchIndex.getFiles('img', rows), preview=True)
+
+        if self.sweepView.isVisible():
+            self.sweepView.showSweep(self.batchIndex.getValIndices(row_idx), row_idx,
+                                     self.filterMask)
+
+    def ensureFullResolution(self):
+        # previews are fine until the view shows more pixels than they have
+        if (self.showingPreview and self.imageView.displayScale() > 1
+                and not self.imageLoader.isRequested(self.simImgPath)):
+            self.imageLoader.request(self.simImgPath)
+
+    def toggleSweepView(self, checked):
+        # small multiples instead of the single image
+        self.imageView.setVisible(not checked)
+        self.sweepView.setVisible(checked)
+        if checked:
+            row_idx = self.simNum - 1
+            self.sweepView.showSweep(self.batchIndex.getValIndices(row_idx), row_idx,
+                                     self.filterMask)
+        else:
+            self.thumbnailLoader.cancel()
 
-        # open the image
-        self.open_image(imgFileName)
+    def sweepSimSelected(self, simNum):
+        # back to the single image of the clicked tile
+        self.sweepAct.setChecked(False)
+        self.toggleSweepView(False)
+        self.jumpToSim(simNum)
 
     def open_batch(self, batchFolder=None):
         # open folder browser
-        baseFolder = self.base_folder
         if not batchFolder:
-            batchFolder = QFileDialog.getExistingDirectory(self, "Open Directory", baseFolder)
+            batchFolder = QFileDialog.getExistingDirectory(self, "Open Directory",
+                                                           self.settings.base_folder)
         else:
-            batchFolder = os.path.join(baseFolder, batchFolder)
+            batchFolder = Batch.get_folder(self.settings, batchFolder)
 
         if batchFolder:
-            # get simulation name
-            fc = os.listdir(batchFolder)
-            fc = [f for f in fc if 'parlist' not in f and 'params' not in f]
-            fc = [f.split('_')[0] for f in fc if '_' in f]
-            simulationName = list(set(fc))
-            if len(simulationName) > 1:
-                raise('ERROR, could not determine simulation name')
-            else:
-                simulationName = simulationName[0]
-
-            # read csv as dataframe:
-            self.parData = pd.read_csv(os.path.join(batchFolder, self.parlist_filename))
-            self.totalNumSims = self.parData.shape[0]
-            # get parameter names:
-            parNames = list(self.parData.columns)
-            parNames.remove('SimNum')
-            self.parNames = parNames
-
-            # get unique values per paramter
-            uniqueVals = []
-            for par in parNames:
-                uniqueVals.append(self.parData[par].unique())
-            self.uniqueVals = uniqueVals
-
-            # add file locations to data frame
-            fImgNameBase = '{0}_{1}\\fig\\overview_{0}_{1}.png'.format(simulationName, '%03i')
-            fMatNameBase = '{0}_{1}\\{0}_{1}_workspace.mat'.format(simulationName, '%03i')
-            fGifNameBase = '{0}_{1}\\fig\\fiber_radius_{0}_{1}.gif'.format(
-                simulationName, '%03i')  # fiber_radius_M500_078
-
-            imgFiles = []
-            matFiles = []
-            gifFiles = []
-            for num in list(self.parData['SimNum']):
-                imgFiles.append(os.path.join(batchFolder, fImgNameBase % (num, num)))
-                matFiles.append(os.path.join(batchFolder, fMatNameBase % (num, num)))
-                gifFiles.append(os.path.join(batchFolder, fGifNameBase % (num, num)))
-
-            self.parData['imgFile'] = imgFiles
-            self.parData['matFile'] = matFiles
-            self.parData['gifFile'] = gifFiles
-
-    def getParameterText(self):
-        # load matfile
-        row_idx = self.simNum - 1
-        matFilePath = self.parData['matFile'].iloc[row_idx]
-        try:
-            mat = MatFileLoader.loadmat(matFilePath, variable_names=['P'])
-        except FileNotFoundError:
-            mat = None
-
-        if mat:
-            # get parameters and format as strings
-            P = mat['P']  # dict for struct P
-            # TODO: delete some less meaningful parameters:
-            keys_to_delete = ['']
-
-            # make text list
-            text_list = []
-            str_lengths = np.zeros((len(P), 2))
-            for idx, (key, value) in enumerate(P.items()):
-                if isinstance(value, np.ndarray):
-                    if value.size == 0:
-                        value = None
-                if value:
-                    if value < 0:
-                        value = '%.3e' % value
-                    elif value >= 0:
-                        value = ' %.3e' % value  # space for - sign alignment
-                else:
-                    value = ''
-                text_list.append([key, value])
-                str_lengths[idx, 0] = len(key)
-                str_lengths[idx, 1] = len(value)
-
-            # find pad length
-            pad_col1 = int(str_lengths[:, 0].max()) + 2
-            pad_col2 = int(str_lengths[:, 1].max()) + 2
-
-            text = ''
-            for t in text_list:
-                name = t[0].rjust(pad_col1)
-                value = t[1].ljust(pad_col2)
-                text += name + '\t:\t' + value + '\n'
-            return text
+            # index, tables and previews, the same as the command line opens
+            # them. Parsing a large parameter list takes a while
+            self.statusbar.setStyleSheet(self.statusbar_style_normal)
+            self.statusbar.showMessage('Opening %s...' % batchFolder)
+            self.showProgress(0, 0)
+            self.openTask = BackgroundTask(Batch, batchFolder, self.settings)
+            self.openTask.signals.finished.connect(self.batchOpened)
+            self.openTask.signals.failed.connect(self.batchFailed)
+            self.openTask.start()
+
+    def batchOpened(self, batch):
+        self.showProgress(1, 1)
+        self.markStartup('batch opened')
+        # the playback runs over the rows of the previous batch
+        self.stopPlayback()
+        previousBatch = self.batch
+        self.batch = batch
+        self.batchIndex = self.batch.index
+        self.totalNumSims = self.batchIndex.numSims
+        self.parNames = self.batchIndex.parNames
+        self.uniqueVals = self.batchIndex.uniqueVals
+        # rows that match the filter, None shows all
+        self.filterMask = None
+        self.filterRows = None
+
+        # P of all sims, if extracted before
+        self.parameterTable = self.batch.parameterTable
+        self.metricTable = self.batch.metricTable
+        self.sweepView.setBatch(self.batchIndex)
+
+        # downscaled previews, generated in the background
+        self.previewCache = self.batch.get_preview_cache()
+        self.thumbnailLoader.previewCache = self.previewCache
+        self.imageLoader.previewCache = self.previewCache
+        self.framePipeline.previewCache = self.previewCache
+        if self.settings.previews == 'background':
+            self.generatePreviews()
+
+        # check which result files exist
+        if self.settings.scan_files == 'background':
+            batchIndex = self.batchIndex
+            self.fileScanTask = BackgroundTask(lambda: (batchIndex, batchIndex.scan_files()))
+            self.fileScanTask.signals.finished.connect(self.filesScanned)
+            self.fileScanTask.start()
+        elif self.settings.scan_files == 'yes':
+            self.batchIndex.fileExists = self.batchIndex.scan_files()
+
+        if not hasattr(self, 'parSliders'):
+            # first batch, create the sliders and show its first sim
+            self.setup_parameter_selector()
+            for action in self.batchActions:
+                action.setEnabled(True)
+            self.markStartup('sliders')
+            self.finishStartup()
+        elif self.sameParameters(previousBatch.index, self.batchIndex):
+            # same sweep, e.g. rerun: keep the sliders where they are, drop the filter
+            self.filterEdit.clear()
+            self.updateFilterWidgets()
+            self.updateImage()
         else:
-            return 'mat file not found... :('
+            # other parameters, new sliders and overview, starting at the middle
+            self.clear_parameter_selector()
+            self.setup_parameter_selector()
+
+    @staticmethod
+    def sameParameters(batchIndex, otherIndex):
+        ''' True if both batches have the same parameters and values '''
+        return (list(batchIndex.parNames) == list(otherIndex.parNames)
+                and all(np.array_equal(np.asarray(values), np.asarray(otherValues))
+                        for values, otherValues in zip(batchIndex.uniqueVals,
+                                                       otherIndex.uniqueVals)))
+
+    def batchFailed(self, message):
+        self.showProgress(1, 1)
+        self.statusbar.showMessage('Could not open the batch: %s' % message)
+        self.statusbar.setStyleSheet(self.statusbar_style_alert)
+        self.finishStartup()
+
+    def showProgress(self, done, total):
+        # a busy indicator for total 0, hidden when done
+        self.progressBar.setRange(0, total)
+        self.progressBar.setValue(done)
+        self.progressBar.setVisible(total == 0 or done < total)
+
+    def extractParameterTable(self):
+        # read P from all workspace files in a process pool
+        self.statusbar.showMessage('Extracting parameters of all simulations...')
+        numWorkers = self.settings.extract_workers or None
+        self.extractTask = BackgroundTask(self.batch.extract_parameters, numWorkers,
+                                          withProgress=True)
+        self.extractTask.signals.progress.connect(self.showProgress)
+        self.extractTask.signals.finished.connect(self.parameterTableExtracted)
+        self.extractTask.signals.failed.connect(self.statusbar.showMessage)
+        self.extractTask.start()
+
+    def parameterTableExtracted(self, table):
+        self.parameterTable = table
+        self.statusbar.setStyleSheet(self.statusbar_style_normal)
+        self.statusbar.showMessage('Extracted %i parameters of %i simulations'
+                                   % (len(table.names), len(table)))
+
+    def extractMetrics(self):
+        # compute the configured metrics from all workspace files in a process pool
+        if not self.settings.metrics:
+            self.statusbar.showMessage('No metrics configured, add them to the METRICS section of the config file')
+            self.statusbar.setStyleSheet(self.statusbar_style_alert)
+            return
+        self.statusbar.showMessage('Extracting metrics of all simulations...')
+        numWorkers = self.settings.extract_workers or None
+        self.metricTask = BackgroundTask(self.batch.extract_metrics, numWorkers,
+                                         withProgress=True)
+        self.metricTask.signals.progress.connect(self.showProgress)
+        self.metricTask.signals.finished.connect(self.metricsExtracted)
+        self.metricTask.signals.failed.connect(self.statusbar.showMessage)
+        self.metricTask.start()
+
+    def metricsExtracted(self, table):
+        self.metricTable = table
+        self.statusbar.setStyleSheet(self.statusbar_style_normal)
+        numValues = np.count_nonzero(~np.isnan(table.values))
+        self.statusbar.showMessage('Extracted %i metric values of %i simulations'
+                                   % (numValues, len(table)))
+
+    def generatePreviews(self):
+        # write the missing previews of all images in a process pool
+        if self.previewCache is None:
+            self.statusbar.showMessage('Previews are disabled in the config file')
+            self.statusbar.setStyleSheet(self.statusbar_style_alert)
+            return
+        numWorkers = self.settings.preview_workers or None
+        self.previewTask = BackgroundTask(self.batch.generate_previews, numWorkers,
+                                          withProgress=True)
+        self.previewTask.signals.progress.connect(self.showProgress)
+        self.previewTask.signals.finished.connect(self.previewsGenerated)
+        self.previewTask.signals.failed.connect(self.statusbar.showMessage)
+        self.previewTask.start()
+
+    def previewsGenerated(self, nbytes):
+        if nbytes:
+            self.statusbar.setStyleSheet(self.statusbar_style_normal)
+            self.statusbar.showMessage('Generated %.1f MB of previews in %s'
+                                       % (nbytes / 2**20, self.previewCache.folder))
+
+    def filesScanned(self, result):
+        batchIndex, fileExists = result
+        batchIndex.fileExists = fileExists
 
     def open_image(self, fileName=None):
         if not fileName:
@@ -518,52 +988,65 @@ class SolutionBrowser(QMainWindow):
         else:
             image = QImage(fileName)
             if image.isNull():
-                self.statusbar.showMessage('Failed to load %03i: %s' %
-                                           (self.simNum, self.simImgPath))
-                self.statusbar.setStyleSheet(self.statusbar_style_alert)
+                self.imageFailed(fileName)
                 return
-
-            self.imageLabel.setPixmap(QPixmap.fromImage(image))
-
-            self.fitToWindowAct.setEnabled(True)
-            self.updateActions()
-
-            if not self.fitToWindowAct.isChecked():
-                self.imageLabel.adjustSize()
-
-            if self.reuseScaleFactor:
-                self.scaleFactor = self.reuseScaleFactor
-                self.scaleImage(self.scaleFactor, isAbsolute=True)
-            else:
-                self.scaleFactor = 1.0
+            self.show_image(image)
+
+    def imageLoaded(self, fileName, image, fullSize=None):
+        if self.showingPreview and fullSize is None and fileName == self.simImgPath:
+            # full resolution of the preview on screen, keep the zoom
+            self.showingPreview = False
+            self.currentImage = image
+            self.imageView.setImage(image)
+            return
+        # zoom as if it were the full image, the view scales the preview
+        self.showingPreview = fullSize is not None
+        self.show_image(image, fullSize)
+
+    def imageFailed(self, fileName):
+        self.statusbar.showMessage('Failed to load %03i: %s' %
+                                   (self.simNum, fileName))
+        self.statusbar.setStyleSheet(self.statusbar_style_alert)
+
+    def show_image(self, image, fullSize=None):
+        self.currentImage = image
+        self.imageView.setImage(image, fullSize)
+        self.fitToWindowAct.setEnabled(True)
+        self.updateActions()
+        self.ensureFullResolution()
+
+    def showCacheStats(self):
+        text = []
+        for name, cache in (('images', self.imageLoader.cache), ('tiles', self.pixmapCache),
+                            ('thumbnails', self.thumbnailLoader.cache)):
+            stats = cache.stats()
+            text.append('%s: %i entries, %.0f/%.0f MB, %i hits, %i misses (%.0f%%), %i evicted' % (
+                name, stats['entries'], stats['MB'], stats['budget MB'], stats['hits'],
+                stats['misses'], 100 * stats['hit rate'], stats['evictions']))
+        if self.previewCache is not None:
+            stats = self.previewCache.stats()
+            text.append('previews: %i files, %.0f/%.0f MB' % (
+                stats['entries'], stats['MB'], stats['budget MB']))
+        self.statusbar.setStyleSheet(self.statusbar_style_normal)
+        self.statusbar.showMessage(' | '.join(text))
 
     def zoomIn(self):
-        self.scaleImage(1.25)
+        self.imageView.setZoom(self.imageView.zoom() * 1.25)
 
     def zoomOut(self):
-        self.scaleImage(0.8)
+        self.imageView.setZoom(self.imageView.zoom() * 0.8)
 
     def normalSize(self):
-        self.imageLabel.adjustSize()
-        self.scaleFactor = 1.0
-
-    def fitToWindow(self, isResizeEvent=False):
-        fitToWindow = self.fitToWindowAct.isChecked()
-        if fitToWindow:
-            # reset image size
-            self.normalSize()
-            # keep aspect ratio...
-            image_size = self.imageLabel.pixmap().size()
-            area_size = self.scrollArea.viewport().size()
-            f_width = area_size.width() / image_size.width()
-            f_height = area_size.height() / image_size.height()
-            new_factor = min((f_width, f_height))
-            self.scaleImage(new_factor)
-            self.reuseScaleFactor = new_factor
-
-        # if not isResizeEvent:
-        #     self.normalSize()
+        self.imageView.setZoom(1.0)
+
+    def fitToWindow(self):
+        # the view refits itself when it is resized
+        self.imageView.setFit(self.fitToWindowAct.isChecked())
+        self.updateActions()
+
+    def zoomChanged(self, factor):
         self.updateActions()
+        self.ensureFullResolution()
 
     def createActions(self):
         self.openAct = QAction("&Open...", self, shortcut="Ctrl+O", triggered=self.open_image)
@@ -580,6 +1063,13 @@ class SolutionBrowser(QMainWindow):
                                       checkable=True, shortcut="Ctrl+F", triggered=self.fitToWindow)
         self.openParAct = QAction("&View Parameters", self,
                                   shortcut="Ctrl+p", triggered=self.viewParameters)
+        self.extractParAct = QAction("&Extract Parameter Table", self,
+                                     triggered=self.extractParameterTable)
+        self.previewAct = QAction("Generate &Previews", self, triggered=self.generatePreviews)
+        self.sweepAct = QAction("S&weep Grid", self, checkable=True, shortcut="Ctrl+G",
+                                triggered=self.toggleSweepView)
+        self.extractMetricsAct = QAction("Extract &Metrics", self, triggered=self.extractMetrics)
+        self.cacheStatsAct = QAction("&Cache Statistics", self, triggered=self.showCacheStats)
 
         self.closeWindow = QShortcut(QKeySequence("Ctrl+W"), self)
         self.closeWindow.activated.connect(self.close)
@@ -589,12 +1079,22 @@ class SolutionBrowser(QMainWindow):
         self.nextShortcut.activated.connect(self.callUpdateImageUp)
         self.prevShortcut.activated.connect(self.callUpdateImageDown)
 
+        # need an open batch, enabled once the first one is
+        self.batchActions = [self.openParAct, self.extractParAct, self.previewAct,
+                             self.sweepAct, self.extractMetricsAct, self.nextShortcut,
+                             self.prevShortcut]
+        for action in self.batchActions:
+            action.setEnabled(False)
+
     def createMenus(self):
         self.fileMenu = QMenu("&File", self)
         self.fileMenu.addAction(self.openBatchAct)
         self.fileMenu.addAction(self.openAct)
         self.fileMenu.addSeparator()
         self.fileMenu.addAction(self.openParAct)
+        self.fileMenu.addAction(self.extractParAct)
+        self.fileMenu.addAction(self.extractMetricsAct)
+        self.fileMenu.addAction(self.previewAct)
         self.fileMenu.addSeparator()
         self.fileMenu.addAction(self.exitAct)
 
@@ -604,6 +1104,9 @@ class SolutionBrowser(QMainWindow):
         self.viewMenu.addAction(self.normalSizeAct)
         self.viewMenu.addSeparator()
         self.viewMenu.addAction(self.fitToWindowAct)
+        self.viewMenu.addAction(self.sweepAct)
+        self.viewMenu.addSeparator()
+        self.viewMenu.addAction(self.cacheStatsAct)
 
         self.helpMenu = QMenu("&Help", self)
         # self.helpMenu.addAction(self.aboutAct)
@@ -613,84 +1116,41 @@ class SolutionBrowser(QMainWindow):
         self.menuBar().addMenu(self.helpMenu)
 
     def updateActions(self):
-        self.zoomInAct.setEnabled(not self.fitToWindowAct.isChecked())
-        self.zoomOutAct.setEnabled(not self.fitToWindowAct.isChecked())
+        zoom = self.imageView.zoom()
+        self.zoomInAct.setEnabled(not self.fitToWindowAct.isChecked() and zoom < MAX_ZOOM)
+        self.zoomOutAct.setEnabled(not self.fitToWindowAct.isChecked() and zoom > MIN_ZOOM)
         self.normalSizeAct.setEnabled(not self.fitToWindowAct.isChecked())
 
-    def scaleImage(self, factor, isAbsolute=False):
-        if isAbsolute:
-            self.scaleFactor = factor
-        else:
-            self.scaleFactor *= factor
-
-        self.imageLabel.resize(self.scaleFactor * self.imageLabel.pixmap().size())
-
-        self.adjustScrollBar(self.scrollArea.horizontalScrollBar(), factor)
-        self.adjustScrollBar(self.scrollArea.verticalScrollBar(), factor)
-
-        self.zoomInAct.setEnabled(self.scaleFactor < 3.0)
-        self.zoomOutAct.setEnabled(self.scaleFactor > 0.333)
-
-    def adjustScrollBar(self, scrollBar, factor):
-        scrollBar.setValue(int(factor * scrollBar.value()
-                               + ((factor - 1) * scrollBar.pageStep() / 2)))
-
     def parse_config(self):
-        # config file name
-        configFileName = 'mySolutionBrowserConfig.ini'
-        filePath = os.path.dirname(os.path.realpath(__file__))
-        configFilePath = os.path.join(filePath, configFileName)
-        # check if exists
-        if os.path.isfile(configFilePath):
-            print('loading config file')
-            self.load_config_file(configFilePath)
-        else:
-            print('creating new config file')
-            self.create_config_file(configFilePath)
-            print('load just created config file')
-            self.load_config_file(configFilePath)
-
-    def create_config_file(self, configFilePath):
-        # create config parser:
-        config = configparser.ConfigParser(allow_no_value=True)
-        # window settings
-        config.add_section('WINDOW')
-        config.set('WINDOW', 'hsize', '3600')
-        config.set('WINDOW', 'vsize', '1600')
-        config.set('WINDOW', 'start_maximized', 'yes')
-        # data settings
-        config.add_section('DATA')
-        config.set('DATA', 'base_folder',
-                   'C:\\Users\\rickw\\OneDrive\\Studie\\BMD_Master\\Internship_ImPhys\\EMech_waves\\mechanical_model\\model\\data')
-        config.set('DATA', 'parlist_filename', 'parlist_sim.csv')
-        config.set('DATA', 'default_set')
-        # AHK settings
-        config.add_section('AHK')
-        config.set('AHK', 'executable_path')
-
-        # Writing our configuration file to
-        with open(configFilePath, 'w') as configfile:
-            config.write(configfile)
-
-    def load_config_file(self, configFilePath):
-        # create config parser:
-        config = configparser.ConfigParser(allow_no_value=True)
-        # load config file
-        config.read(configFilePath)
+        # the config file next to this file, created with the defaults if missing
+        print('loading config file')
+        self.load_config(read_config())
 
+    def load_config(self, config):
         # Window section
         self.hsize = config.getint('WINDOW', 'hsize')
         self.vsize = config.getint('WINDOW', 'vsize')
         self.isStartMaximized = config.getboolean('WINDOW', 'start_maximized')
 
-        # data section
-        self.base_folder = config.get('DATA', 'base_folder')
-        self.parlist_filename = config.get('DATA', 'parlist_filename')
-        self.default_set = config.get('DATA', 'default_set')
+        # data, previews, extraction and metrics, shared with the command line
+        self.settings = BatchSettings(config)
 
         # AHK section
         self.ahk_executable_path = config.get('AHK', 'executable_path')
 
+        # loading section, fall back to defaults for older config files
+        self.prefetch_depth = config.getint('LOADING', 'prefetch_depth', fallback=1)
+        self.decode_workers = config.getint('LOADING', 'decode_workers', fallback=2)
+        self.image_cache_mb = config.getint('LOADING', 'image_cache_mb', fallback=1024)
+        self.pixmap_cache_mb = config.getint('LOADING', 'pixmap_cache_mb', fallback=256)
+        self.thumbnail_workers = config.getint('LOADING', 'thumbnail_workers', fallback=0)
+        self.thumbnail_cache_mb = config.getint('LOADING', 'thumbnail_cache_mb', fallback=128)
+        self.play_fps = config.getfloat('LOADING', 'play_fps', fallback=10)
+        self.play_buffer = config.getint('LOADING', 'play_buffer', fallback=16)
+        self.play_workers = config.getint('LOADING', 'play_workers', fallback=2)
+        self.gif_streaming = config.getboolean('LOADING', 'gif_streaming', fallback=True)
+        self.gif_buffer = config.getint('LOADING', 'gif_buffer', fallback=8)
+
 
 class SolutionBrowserLayout(QWidget):
     def __init__(self, parent):
@@ -713,6 +1173,81 @@ class SolutionBrowserLayout(QWidget):
         self.principalLayout.setContentsMargins(1, 1, 1, 1)
 
 
+class ParameterModel(QAbstractTableModel):
+    ''' field names and values of P. Values that changed in the last update are highlighted '''
+    SortRole = Qt.UserRole
+    highlightColor = QColor(255, 236, 140)
+
+    def __init__(self, parent=None):
+        super(ParameterModel, self).__init__(parent)
+        self.names = []
+        self.values = []
+        self.texts = []
+        self.changed = set()
+        # id(P) -> (P, names, values, texts). The loader hands out the same P
+        # for a cached sim, so going back does not format the values again.
+        # P is kept, its id cannot be reused while it is cached
+        self.formatted = ImageCache(maxEntries=PARAMETER_TEXT_ENTRIES)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.names)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else 2
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return ('Name', 'Value')[section]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        row, col = index.row(), index.column()
+        if role == Qt.DisplayRole:
+            return self.names[row] if col == 0 else self.texts[row]
+        if role == self.SortRole:
+            if col == 0:
+                return self.names[row]
+            value = self.values[row]
+            # numbers sort numerically, everything else after them by text
+            if isinstance(value, (int, float, np.number)) and not isinstance(value, bool):
+                return float(value)
+            return self.texts[row]
+        if role == Qt.BackgroundRole and row in self.changed:
+            return self.highlightColor
+        return None
+
+    def format(self, P):
+        ''' names, values and value texts of the fields of P, cached per P '''
+        entry = self.formatted.get(id(P))
+        if entry is None or entry[0] is not P:
+            fields = list_parameters(P)
+            names = [name for name, _ in fields]
+            values = [value for _, value in fields]
+            texts = [format_value(value).strip() for value in values]
+            entry = (P, names, values, texts)
+            self.formatted.put(id(P), entry)
+        return entry[1:]
+
+    def setParameters(self, P):
+        ''' shows the fields of P, None clears the table '''
+        names, values, texts = self.format(P) if P is not None else ([], [], [])
+
+        if names != self.names:
+            # other fields, rebuild
+            self.beginResetModel()
+            self.names, self.values, self.texts = names, values, texts
+            self.changed = set()
+            self.endResetModel()
+            return
+
+        # same fields, only update the cells whose value changed
+        previous = self.changed
+        self.changed = {row for row in range(len(names)) if texts[row] != self.texts[row]}
+        self.values, self.texts = values, texts
+        for row in sorted(self.changed | previous):
+            self.dataChanged.emit(self.index(row, 0), self.index(row, 1))
+
+
 class ParDialog(QMainWindow):
     def __init__(self, parent=None):
         super(ParDialog, self).__init__(parent)
@@ -739,20 +1274,38 @@ class ParDialog(QMainWindow):
         self.label = QLabel(self.frame)
         self.label.setText('Parameters:')
 
-        # Add text field
-        self.textfield = QTextBrowser(self.frame)
-        self.textfield.insertPlainText("Parameter names and values listed here:\n")
-        self.textfield.setLineWrapMode(0)
+        # filter on field name
+        self.filterBox = QLineEdit(self.frame)
+        self.filterBox.setPlaceholderText('Filter by name')
+        self.filterBox.setClearButtonEnabled(True)
+
+        # Add table with sorting and filtering on top of the model
+        self.model = ParameterModel(self)
+        self.proxy = QSortFilterProxyModel(self)
+        self.proxy.setSourceModel(self.model)
+        self.proxy.setSortRole(ParameterModel.SortRole)
+        self.proxy.setFilterKeyColumn(0)
+        self.proxy.setFilterCaseSensitivity(Qt.CaseInsensitive)
+        self.filterBox.textChanged.connect(self.proxy.setFilterFixedString)
+
+        self.table = QTableView(self.frame)
+        self.table.setModel(self.proxy)
+        self.table.setSortingEnabled(True)
+        self.table.sortByColumn(-1, Qt.AscendingOrder)  # file order until a header is clicked
+        self.table.verticalHeader().setVisible(False)
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
+        self.table.horizontalHeader().setStretchLastSection(True)
         monofont = QFont()
         monofont.setFamily("Courier New")
-        self.textfieldFontSize = 10
-        monofont.setPointSize(self.textfieldFontSize)
+        self.tableFontSize = 10
+        monofont.setPointSize(self.tableFontSize)
         self.monofont = monofont
-        self.textfield.setFont(monofont)
+        self.table.setFont(monofont)
 
         # add to layout
         self.layout.addWidget(self.label)
-        self.layout.addWidget(self.textfield)
+        self.layout.addWidget(self.filterBox)
+        self.layout.addWidget(self.table)
         self.setCentralWidget(self.frame)
         # self.layout.setContentsMargins(1, 1, 1, 1)
         self.createActions()
@@ -761,12 +1314,14 @@ class ParDialog(QMainWindow):
         # let parent now that I am closed
         self.parent.parDialogOpen = False
 
-    def updateText(self, text=None):
-        self.textfield.clear()
-        if text:
-            self.textfield.insertPlainText(text)
+    def updateParameters(self, P, error=None):
+        # only the changed cells are updated and highlighted
+        if P is None:
+            self.label.setText('Parameters: %s' % error)
+            self.model.setParameters(None)
         else:
-            self.textfield.insertPlainText("updated\n")
+            self.label.setText('Parameters:')
+            self.model.setParameters(P)
 
     def createActions(self):
         self.close_shortcut = QShortcut(QKeySequence("Ctrl+Q"), self)
@@ -789,28 +1344,35 @@ class ParDialog(QMainWindow):
         self.parent.close()
 
     def increaseFontSize(self):
-        self.textfieldFontSize += 1
+        self.tableFontSize += 1
         self.updateFontSize()
 
     def decreaseFontSize(self):
-        self.textfieldFontSize -= 1
+        self.tableFontSize -= 1
         self.updateFontSize()
 
     def updateFontSize(self):
-        self.monofont.setPointSize(self.textfieldFontSize)
-        self.textfield.setFont(self.monofont)
+        self.monofont.setPointSize(self.tableFontSize)
+        self.table.setFont(self.monofont)
 
 
 if __name__ == '__main__':
-    import sys
-    import ctypes
-    # fix icon stuff
-    myappid = u'mycompany.myproduct.subproduct.version'  # arbitrary string (unicode)
-    ctypes.windll.shell32.SetCurrentProcessExplicitAppUserModelID(myappid)
+    if sys.platform == 'win32':
+        import ctypes
+        # fix icon stuff
+        myappid = u'mycompany.myproduct.subproduct.version'  # arbitrary string (unicode)
+        ctypes.windll.shell32.SetCurrentProcessExplicitAppUserModelID(myappid)
 
     # cd to file dir
     os.chdir(os.path.dirname(os.path.abspath(__file__)))
 
+    # --startup-timing prints how long the imports and every startup phase take
+    startupTimer = None
+    if '--startup-timing' in sys.argv:
+        sys.argv.remove('--startup-timing')
+        startupTimer = StartupTimer()
+        startupTimer.mark('imports')
+
     # see if there are any input arguments
     if len(sys.argv) > 1:
         batchToLoad = sys.argv[1]
@@ -819,8 +1381,12 @@ if __name__ == '__main__':
 
     # launch app
     app = QApplication(sys.argv)
-    w = SolutionBrowser(batchToLoad)
+    if startupTimer is not None:
+        startupTimer.mark('QApplication')
+    w = SolutionBrowser(batchToLoad, startupTimer)
     w.show()
+    if startupTimer is not None:
+        startupTimer.mark('show')
 
     # exit when app is exit
     sys.exit(app.exec_())
@@ -0,0 +1,69 @@
+'''
+Sidecar index of a batch: reused while the parameter list does not change
+'''
+import os
+import sys
+import pytest
+
+np = pytest.importorskip('numpy')
+pytest.importorskip('pandas')
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from BatchIndex import BatchIndex, INDEX_FILENAME  # noqa: E402
+from ParameterTable import ParameterTable  # noqa: E402
+from MetricTable import MetricTable  # noqa: E402
+
+PARLIST = 'parlist_sim.csv'
+
+
+@pytest.fixture
+def batch(tmp_path):
+    with open(tmp_path / PARLIST, 'w') as f:
+        f.write('SimNum,E,nu\n1,1,0.1\n2,1,0.2\n3,2,0.1\n4,2,0.2\n')
+    for num in range(1, 5):
+        os.mkdir(tmp_path / ('sim_%03i' % num))
+    BatchIndex.open_batch(str(tmp_path), PARLIST)
+    return tmp_path
+
+
+def load(batch):
+    return BatchIndex.load(str(batch / INDEX_FILENAME), str(batch / PARLIST))
+
+
+def test_reused(batch):
+    index = load(batch)
+    assert index is not None
+    assert index.simulationName == 'sim'
+    assert index.getRowIndex([1, 0]) == 2
+
+
+@pytest.mark.parametrize('get_filename', [ParameterTable.get_filename,
+                                          MetricTable.get_filename])
+def test_sidecars_keep_the_index(batch, get_filename):
+    # the browser writes its own tables next to the index
+    table = ParameterTable(np.arange(1, 5), ['a'], np.zeros((4, 1)),
+                           np.zeros(4), np.zeros(4, dtype=np.int64), ['a'])
+    table.save(get_filename(str(batch)))
+    assert load(batch) is not None
+
+
+def test_previews_keep_the_index(batch):
+    # the preview folder of PreviewCache.get_folder
+    os.mkdir(batch / 'solutionbrowser-previews')
+    assert load(batch) is not None
+
+
+@pytest.mark.parametrize('content', [b'', b'PK\x03\x04truncated'])
+def test_corrupt_index_is_rebuilt(batch, content):
+    with open(batch / INDEX_FILENAME, 'wb') as f:
+        f.write(content)
+    assert load(batch) is None
+    BatchIndex.open_batch(str(batch), PARLIST)
+    assert load(batch) is not None
+
+
+def test_changed_parlist(batch):
+    with open(batch / PARLIST, 'a') as f:
+        f.write('5,3,0.1\n')
+    os.utime(batch / PARLIST, (0, 0))
+    assert load(batch) is None
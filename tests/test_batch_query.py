@@ -0,0 +1,44 @@
+'''
+Filter expressions evaluated over a small 2 x 3 sweep
+'''
+import os
+import sys
+import pytest
+
+np = pytest.importorskip('numpy')
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from BatchIndex import BatchIndex  # noqa: E402
+from BatchQuery import BatchQuery  # noqa: E402
+
+
+@pytest.fixture
+def query():
+    # E in (1, 2) x nu in (0.1, 0.2, 0.3), sims 1..6
+    codes = np.array([[e, nu] for e in range(2) for nu in range(3)], dtype=np.uint8)
+    index = BatchIndex(np.arange(1, 7), ['E', 'nu'], codes,
+                       [np.array([1.0, 2.0]), np.array([0.1, 0.2, 0.3])])
+    return BatchQuery(index)
+
+
+@pytest.mark.parametrize('expression, rows', [
+    ('E > 1 and nu < 0.3', [3, 4]),
+    ('E > 1 or nu > 0.2', [2, 3, 4, 5]),
+    # columns mixed with constants broadcast
+    ('E > 1 and True', [3, 4, 5]),
+    ('nu > 0.2 or 1', [0, 1, 2, 3, 4, 5]),
+    ('E > 1 and nu < 0.3 and 0', []),
+])
+def test_bool_ops(query, expression, rows):
+    assert np.flatnonzero(query.evaluate(expression)).tolist() == rows
+
+
+@pytest.mark.parametrize('expression', [
+    'E > 1 and',
+    'nosuch > 1',
+    'abs(E, nu)',
+    'E > "a"',
+])
+def test_invalid_expressions(query, expression):
+    with pytest.raises(ValueError):
+        query.evaluate(expression)
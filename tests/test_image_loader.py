@@ -0,0 +1,61 @@
+'''
+ImageLoader requests, including requests made from inside its own signals
+'''
+import os
+import sys
+import pytest
+
+QtGui = pytest.importorskip('PyQt5.QtGui')
+from PyQt5.QtCore import QCoreApplication, QElapsedTimer  # noqa: E402
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ImageLoader import ImageLoader  # noqa: E402
+
+TIMEOUT_MS = 10000
+
+
+@pytest.fixture(scope='module')
+def app():
+    return QCoreApplication.instance() or QCoreApplication([])
+
+
+@pytest.fixture
+def images(tmp_path):
+    fileNames = []
+    for idx in range(2):
+        image = QtGui.QImage(32, 16, QtGui.QImage.Format_RGB32)
+        image.fill(idx)
+        fileName = str(tmp_path / ('img%i.png' % idx))
+        assert image.save(fileName)
+        fileNames.append(fileName)
+    return fileNames
+
+
+def wait_for(condition):
+    timer = QElapsedTimer()
+    timer.start()
+    while not condition() and timer.elapsed() < TIMEOUT_MS:
+        QCoreApplication.processEvents()
+    return condition()
+
+
+def test_request_from_image_loaded(app, images):
+    loader = ImageLoader()
+    loaded = []
+    loader.imageLoaded.connect(lambda fileName, image, fullSize: loaded.append(fileName))
+    loader.request(images[0])
+    assert wait_for(lambda: loaded == [images[0]])
+
+    # a cached image is delivered right away, the slot requests the next one
+    # from inside that delivery, like the full resolution of a preview
+    def requestNext(fileName, image, fullSize):
+        if fileName == images[0]:
+            loader.request(images[1])
+    loader.imageLoaded.connect(requestNext)
+    loader.request(images[0])
+    assert wait_for(lambda: images[1] in loaded)
+    assert loaded == [images[0], images[0], images[1]]
+
+    # every task reports back, none was dropped while still queued
+    assert wait_for(lambda: not loader.tasks)
+    loader.shutdown()
@@ -0,0 +1,70 @@
+'''
+Startup budget: the window must come up within the budget, without importing
+pandas, scipy or h5py. Runs the GUI with --startup-timing in a subprocess,
+offscreen when there is no display.
+'''
+import os
+import re
+import subprocess
+import sys
+import threading
+import pytest
+
+pytest.importorskip('PyQt5.QtWidgets')
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BUDGET_MS = 1000
+# give up waiting for the report after this long
+TIMEOUT_S = 60
+
+
+def run_startup(batchFolder):
+    ''' lines of the startup timing report, up to the total '''
+    env = dict(os.environ, PYTHONUNBUFFERED='1')
+    if sys.platform.startswith('linux') and not (env.get('DISPLAY') or env.get('WAYLAND_DISPLAY')):
+        env['QT_QPA_PLATFORM'] = 'offscreen'
+    proc = subprocess.Popen([sys.executable, os.path.join(ROOT, 'mySolutionBrowser.py'),
+                             '--startup-timing', batchFolder],
+                            stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                            universal_newlines=True, env=env)
+    watchdog = threading.Timer(TIMEOUT_S, proc.kill)
+    watchdog.start()
+    lines = []
+    try:
+        # the GUI keeps running after the report
+        for line in proc.stdout:
+            lines.append(line.rstrip())
+            if line.startswith('total'):
+                break
+    finally:
+        watchdog.cancel()
+        proc.kill()
+        proc.communicate()
+    return lines
+
+
+def test_startup_budget(tmp_path):
+    # an empty folder is not a batch, the report is printed when opening it failed
+    lines = run_startup(str(tmp_path))
+    if not lines or not lines[-1].startswith('total'):
+        output = '\n'.join(lines)
+        if 'platform plugin' in output:
+            pytest.skip('no display and no offscreen Qt platform')
+        pytest.fail('no startup timing report:\n%s' % output)
+
+    # phases are printed as name and duration, the window is up at the event loop
+    windowTime = 0.0
+    for line in lines:
+        match = re.match(r'(\S.*?)\s+(-?\d+\.\d) ms$', line)
+        if match is None:
+            continue
+        windowTime += float(match.group(2))
+        if match.group(1) == 'event loop':
+            break
+    else:
+        pytest.fail('window did not come up:\n%s' % '\n'.join(lines))
+    assert windowTime <= BUDGET_MS, '\n'.join(lines)
+
+    # pandas, scipy and h5py are listed when they were imported before the window
+    imported = [line for line in lines if line.startswith('imported at startup')]
+    assert not imported, imported